@@ -0,0 +1,13 @@
+# module level doc-string
+__doc__ = """
+benchmarks - performance benchmarks for the Annex A cleaner
+===========================================================
+
+Generates synthetic Annex A workbooks from the data map and times the
+stages of :func:`fddc.annex_a.cleaner.clean` and
+:func:`fddc.annex_a.custom_cleaner.custom_clean`, writing the results
+as JSON so that runs can be compared over time.
+
+    python -m benchmarks.run --rows 10000 100000 --output results.json
+    python -m benchmarks.compare baseline.json results.json
+"""
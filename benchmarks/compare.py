@@ -0,0 +1,51 @@
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Tuple
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 1.2) -> List[Tuple]:
+    """
+    Compares two benchmark results and returns (rows, stage, measure, baseline, current, ratio, regression) for every
+    stage and measure present in both. regression is True when the ratio is above threshold.
+    """
+    baseline_runs = {run["rows"]: run["stages"] for run in baseline["runs"]}
+    comparison = []
+    for run in current["runs"]:
+        baseline_stages = baseline_runs.get(run["rows"])
+        if baseline_stages is None:
+            continue
+        for stage, values in run["stages"].items():
+            for measure, value in values.items():
+                baseline_value = baseline_stages.get(stage, {}).get(measure)
+                if baseline_value:
+                    ratio = value / baseline_value
+                    comparison.append((run["rows"], stage, measure, baseline_value, value, ratio, ratio > threshold))
+    return comparison
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline", help="Results to compare against")
+    parser.add_argument("current", help="New results")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="Ratio of current to baseline above which a measure counts as a regression")
+    options = parser.parse_args(args)
+
+    with open(options.baseline) as file:
+        baseline = json.load(file)
+    with open(options.current) as file:
+        current = json.load(file)
+
+    regressions = 0
+    for rows, stage, measure, baseline_value, value, ratio, regression in compare(baseline, current,
+                                                                                  options.threshold):
+        flag = "REGRESSION" if regression else ""
+        regressions += 1 if regression else 0
+        print(f"{rows:>9} {stage:<14} {measure:<16} {baseline_value:>12.3f} {value:>12.3f} {ratio:>7.2f} {flag}")
+
+    return 1 if regressions > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,138 @@
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, List
+
+import pandas as pd
+
+from benchmarks.synthetic import generate_annex_a
+from fddc.annex_a.cleaner import categorise_sheet, clean
+from fddc.annex_a.custom_cleaner import custom_clean
+from fddc.annex_a.matching_report import MatchingReportWriter
+from fddc.config import Config
+
+logger = logging.getLogger('benchmarks.run')
+
+DEFAULT_ROWS = [10000, 100000, 1000000]
+
+
+@contextmanager
+def measure(results: Dict[str, Any], stage: str, memory: bool = True):
+    """
+    Records the wall-clock time and, if memory is True, the peak traced memory of the enclosed block
+    """
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_result = dict(seconds=time.perf_counter() - start)
+        if memory:
+            stage_result["peak_memory_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+        results[stage] = stage_result
+        logger.info(f"{stage}: {stage_result}")
+
+
+def run_stages(input_file: str, output_dir: str, data_config: Dict[str, Any], memory: bool = True) -> Dict[str, Any]:
+    """
+    Times the stages of :func:`fddc.annex_a.cleaner.clean` one by one, then the complete clean and custom clean
+    """
+    stages: Dict[str, Any] = {}
+
+    with measure(stages, "read", memory):
+        sheets = pd.read_excel(input_file, sheet_name=list(data_config))
+
+    with measure(stages, "categorise", memory):
+        matches = {item: categorise_sheet(item, sheets[item], data_config[item]) for item in data_config}
+
+    with measure(stages, "dedupe", memory):
+        for item in data_config:
+            sheets[item].drop_duplicates(inplace=True)
+
+    with measure(stages, "write", memory):
+        writer = pd.ExcelWriter(os.path.join(output_dir, "stage-cleaned.xlsx"), engine='xlsxwriter')
+        report = MatchingReportWriter(os.path.join(output_dir, "stage-matching_report.xlsx"))
+        for item in data_config:
+            report.write_sheet(item, [(col, match, [c["code"] for c in data_config[item][col]])
+                                      for col, match in matches[item]])
+            sheets[item].to_excel(writer, sheet_name=item, index=False)
+        report.save()
+        writer.save()
+    del sheets, matches
+
+    cleaned_file = os.path.join(output_dir, "cleaned.xlsx")
+    matching_report_file = os.path.join(output_dir, "matching_report.xlsx")
+    with measure(stages, "clean", memory):
+        clean(input_file, cleaned_file, matching_report_file, data_config)
+
+    with measure(stages, "custom_clean", memory):
+        custom_clean(cleaned_file, matching_report_file, os.path.join(output_dir, "final_cleaned.xlsx"), data_config)
+
+    return stages
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(rows: List[int], config_file: str = "config/data-map.yml", memory: bool = True, seed: int = 0,
+        work_dir: str = None) -> Dict[str, Any]:
+    """
+    Runs the benchmark for each number of rows per list and returns the results
+    """
+    data_config = Config(config_file)["data_config"]
+    results = dict(
+        created=datetime.datetime.now().isoformat(),
+        commit=_git_commit(),
+        python=platform.python_version(),
+        pandas=pd.__version__,
+        memory=memory,
+        runs=[],
+    )
+
+    with tempfile.TemporaryDirectory(dir=work_dir) as directory:
+        for row_count in rows:
+            input_file = generate_annex_a(os.path.join(directory, f"synthetic-{row_count}.xlsx"), data_config,
+                                          row_count, seed=seed)
+            logger.info(f"Running benchmark with {row_count} rows per list")
+            stages = run_stages(input_file, directory, data_config, memory=memory)
+            results["runs"].append(dict(rows=row_count, stages=stages))
+
+    return results
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Annex A cleaner on synthetic data")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS, help="Rows per list for each run")
+    parser.add_argument("--config", default="config/data-map.yml", help="Data map to generate data and clean with")
+    parser.add_argument("--output", default="benchmark-results.json", help="JSON file to write the results to")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic data")
+    parser.add_argument("--no-memory", dest="memory", action="store_false",
+                        help="Do not trace memory - faster, but no peak memory figures")
+    parser.add_argument("--work-dir", default=None, help="Directory for the generated workbooks")
+    options = parser.parse_args(args)
+
+    logging.basicConfig(level=logging.INFO)
+    results = run(options.rows, config_file=options.config, memory=options.memory, seed=options.seed,
+                  work_dir=options.work_dir)
+
+    with open(options.output, "wt") as file:
+        json.dump(results, file, indent=2)
+    logger.info(f"Results written to {options.output}")
+
+
+if __name__ == '__main__':
+    main()
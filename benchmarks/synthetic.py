@@ -0,0 +1,99 @@
+import datetime
+import logging
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from fddc.annex_a.custom_cleaner import no_duplicates
+
+logger = logging.getLogger('benchmarks.synthetic')
+
+
+def _variants(category: Dict[str, Any]) -> List[str]:
+    """
+    Returns the kind of values found in real returns for a single category: the code itself, the name in
+    different cases and with stray whitespace, abbreviations and the occasional typo
+    """
+    code = str(category['code'])
+    name = str(category['name'])
+    variants = [
+        code,
+        name,
+        name.lower(),
+        name.upper(),
+        ' {} '.format(name),
+        '{}  '.format(code),
+        name[:3],
+        code.split(' ')[-1],
+        name.replace(' ', '  '),
+    ]
+    if len(name) > 4:
+        # Swap two letters to create a typo
+        variants.append(name[:2] + name[3] + name[2] + name[4:])
+    return variants
+
+
+def messy_values(config: List[Dict[str, Any]], rows: int, random_state: np.random.RandomState,
+                 unmatched_share: float = 0.05, missing_share: float = 0.05) -> np.ndarray:
+    """
+    Generates rows values for a column configured with the categories in config
+    """
+    variants = [v for category in config for v in _variants(category)]
+    values = random_state.choice(np.array(variants, dtype=object), size=rows)
+
+    # Free text that will not match any category
+    unmatched = random_state.random_sample(rows) < unmatched_share
+    values[unmatched] = ['Free text {}'.format(ix) for ix in random_state.randint(0, max(rows // 20, 1),
+                                                                                      size=unmatched.sum())]
+
+    missing = random_state.random_sample(rows) < missing_share
+    values[missing] = None
+    return values
+
+
+def _dates(rows: int, random_state: np.random.RandomState) -> np.ndarray:
+    start = datetime.date(2015, 1, 1)
+    days = random_state.randint(0, 365 * 5, size=rows)
+    return np.array([start + datetime.timedelta(days=int(d)) for d in days], dtype=object)
+
+
+def synthetic_list(list_name: str, list_config: Dict[str, List[Dict[str, Any]]], rows: int,
+                   random_state: np.random.RandomState) -> pd.DataFrame:
+    """
+    Generates a synthetic Annex A list with the columns configured in the data map, plus the columns used to
+    remove duplicates by :func:`fddc.annex_a.custom_cleaner.custom_clean`
+    """
+    data: Dict[str, Any] = {}
+    for column in no_duplicates.get(list_name, ['Child Unique ID']):
+        if column == 'Child Unique ID':
+            # Roughly three rows per child, so that deduplication has something to do
+            data[column] = random_state.randint(0, max(rows // 3, 1), size=rows)
+        elif column not in list_config:
+            data[column] = _dates(rows, random_state)
+
+    for column, config in list_config.items():
+        data[column] = messy_values(config, rows, random_state)
+
+    return pd.DataFrame(data)
+
+
+def generate_annex_a(filename: str, data_config: Dict[str, Dict[str, List[Dict[str, Any]]]], rows: int,
+                     seed: int = 0) -> str:
+    """
+    Writes a synthetic Annex A workbook with rows rows per list, using the lists and categories in data_config
+
+    :param filename: the workbook to write
+    :param data_config: the 'data_config' section of data-map.yml
+    :param rows: number of rows per list
+    :param seed: seed for the random values, so that runs are comparable
+    :return: the filename
+    """
+    random_state = np.random.RandomState(seed)
+    logger.info(f"Generating {rows} rows per list in {filename}")
+    writer = pd.ExcelWriter(filename, engine='xlsxwriter')
+    for list_name, list_config in data_config.items():
+        df = synthetic_list(list_name, list_config, rows, random_state)
+        df.to_excel(writer, sheet_name=list_name, index=False)
+    writer.save()
+    return filename
@@ -0,0 +1,102 @@
+import bisect
+import itertools
+import logging
+from typing import List, Dict, Any, Iterable
+import numpy as np
+import pandas as pd
+
+from fddc.regex import RegexSet
+
+logger = logging.getLogger('fddc.annex_a.category_index')
+
+NOT_MATCHED = 'not matched'
+
+
+class CategoryIndex:
+    """
+    A compiled index of the categories configured for a single column in the data map.
+
+    Categorises whole arrays of values at a time and gives the same results as
+    :func:`fddc.annex_a.cleaner.make_category`: each value gets the code of the first category whose
+    code equals the value, whose code or name is contained in the value, or whose regex matches it.
+
+    The work is done in three tiers:
+        1. a hash lookup of values that are exactly equal to a code
+        2. a substring search for each code and name over all values at once - the values are joined
+           into a single buffer so the search runs at C speed and only visits the values that contain it
+        3. a single combined regex scan (:class:`fddc.regex.RegexSet`) per value
+    """
+
+    def __init__(self, config: List[Dict[str, Any]]):
+        self.codes = [c['code'] for c in config]
+
+        self.__exact: Dict[Any, int] = {}
+        for ix, c in enumerate(config):
+            self.__exact.setdefault(c['code'], ix)
+
+        self.__needles = [(c['code'], c['name']) for c in config]
+        self.__regex_set = RegexSet([r for c in config for r in c.get('regex', [])],
+                                    labels=[ix for ix, c in enumerate(config) for r in c.get('regex', [])])
+
+        # The last entry is the result for values that did not match any category
+        self.__results = np.array(self.codes + [NOT_MATCHED], dtype=object)
+
+    def positions(self, values: Iterable[Any]) -> np.ndarray:
+        """
+        Returns the position of the matched category for each value, or len(codes) if none matched
+        """
+        values = pd.Series(values, dtype=object).reset_index(drop=True)
+        strings = values.map(str).to_numpy()
+        not_matched = len(self.codes)
+
+        # Tier 1 - values that are a code
+        best = values.map(self.__exact).fillna(not_matched).to_numpy(dtype=np.int64)
+
+        # Tier 2 - codes and names contained in the value
+        self.__find_contained(strings, best)
+
+        # Tier 3 - the first regex that matches, which only counts if it belongs to an earlier category
+        if len(self.__regex_set) > 0:
+            candidates = np.flatnonzero(best > 0)
+            regex_best = np.fromiter((self.__regex_set.match(value, default=not_matched)
+                                      for value in strings[candidates]), dtype=np.int64, count=len(candidates))
+            best[candidates] = np.minimum(best[candidates], regex_best)
+
+        return best
+
+    def __find_contained(self, strings: np.ndarray, best: np.ndarray):
+        if len(strings) == 0:
+            return
+
+        separator = '\x00'
+        if any(separator in value for value in strings):
+            # The buffer cannot be split safely, so check each value on its own
+            for row, value in enumerate(strings):
+                for ix, (code, name) in enumerate(self.__needles[:best[row]]):
+                    if code in value or name in value:
+                        best[row] = ix
+                        break
+            return
+
+        buffer = separator.join(strings)
+        starts = list(itertools.accumulate([0] + [len(value) + 1 for value in strings[:-1]]))
+        ends = starts[1:] + [len(buffer)]
+
+        for ix, (code, name) in enumerate(self.__needles):
+            for needle in (code, name):
+                if len(needle) == 0:
+                    np.minimum(best, ix, out=best)
+                    continue
+                position = buffer.find(needle)
+                while position != -1:
+                    row = bisect.bisect_right(starts, position) - 1
+                    if best[row] > ix:
+                        best[row] = ix
+                    # Continue with the next value, as we only need to know whether this one contains the needle
+                    position = buffer.find(needle, ends[row])
+
+    def categorise(self, values: Iterable[Any]) -> np.ndarray:
+        """
+        Returns the matched category code for each value, or 'not matched'
+        """
+        return self.__results[self.positions(values)]
@@ -3,10 +3,11 @@ import re
 import os
 import yaml
 import pandas as pd
-from fddc.regex import parse_regex
-from openpyxl import Workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.utils.cell import get_column_letter
+from fddc.regex import RegexSet
+from fddc.annex_a.category_index import CategoryIndex
+from fddc.annex_a.mapping_store import MappingStore
+from fddc.annex_a.matching_report import MatchingReportWriter
+from fddc.parallel import map_ordered
 
 logger = logging.getLogger('spreadsheetcleaner')
 
@@ -14,20 +15,25 @@ logger = logging.getLogger('spreadsheetcleaner')
 # Functions to categorise data
 
 def make_category(config):
+    # All regex rules compiled into one matcher, labelled with the position of their category
+    regex_set = RegexSet([r for c in config for r in c.get('regex', [])],
+                         labels=[ix for ix, c in enumerate(config) for r in c.get('regex', [])])
+
     def categorize(series):
-        for c in config:
+        value = str(series)
+        # A regex match only wins if no earlier category matches on code or name
+        regex_match = regex_set.match(value, default=len(config))
+        for c in config[:regex_match]:
             if series == c['code']:
                 return c['code']
-            elif c['code'] in str(series):
+            elif c['code'] in value:
                 return c['code']
-            elif c['name'] in str(series):
+            elif c['name'] in value:
                 return c['code']
 
-            for r in c.get('regex',[]):
-                p = parse_regex(r)
-                if p.match(str(series)) is not None:
-                    return c['code']
-                
+        if regex_match < len(config):
+            return config[regex_match]['code']
+
         return 'not matched'
     return categorize
 
@@ -39,107 +45,81 @@ def make_map(original, new):
     return values
 
 
-# Function to create data validation object
+# Functions to clean a single sheet - kept at module level so that they can run in a process pool
+
+def categorise_sheet(item, df, settings, store=None):
+    '''Replaces values in the columns of df that are configured in settings.
+    Returns a list of (column, {former value: new value}) for the matching report'''
+    matches = []
+    # Run through config criteria for that sheet
+    for col in settings:
+        if df[df[col].notnull()].shape[0] > 0: # Only look at non-empty columns
+
+            # Map current value to match value
+            df[col] = df[col].str.strip()
+            unique = df[col].unique()
+            if store is None:
+                clean_series = CategoryIndex(settings[col]).categorise(unique).tolist()
+            else:
+                clean_series = store.categorise(item, col, settings[col], unique)
+            match = make_map(unique, clean_series)
+
+            # Replace values in sheet
+            df[col] = df[col].replace(match)
+            matches.append((col, match))
+
+    return matches
 
-def validation_from_list(validation_range):
-    '''Creates a data validation object based on validation_range (cell range to point to). 
-    Requires import of DataValidation from openpyxl.worksheet.datavalidation '''
-    from openpyxl.worksheet.datavalidation import DataValidation
-    validation = DataValidation(type='list', formula1=validation_range)
-    validation.error = 'Your entry is not in the list'
-    validation.errorTitle = 'Invalid Entry'
-    validation.prompt = 'Please select from the list'
-    validation.promptTitle = 'List Selection'
-    
-    return validation
+
+def clean_sheet(task):
+    '''Replaces values in a single sheet following the rules in settings and removes duplicates.
+    task is a tuple of (sheet name, dataframe, settings, mapping store path or None).
+    Returns the cleaned dataframe and a list of (column, {former value: new value}) for the matching report'''
+    item, df, settings, mapping_store = task
+    store = MappingStore(mapping_store) if mapping_store is not None else None
+
+    matches = categorise_sheet(item, df, settings, store)
+
+    if store is not None:
+        store.close()
+
+    # Take out duplicates
+    df.drop_duplicates(inplace=True)
+
+    return df, matches
 
 
 # Main function to go through spreadsheet and replace data
 
-def clean(input_file, output_file, matching_report_file, data_config, **args):
+def clean(input_file, output_file, matching_report_file, data_config, mapping_store=None,
+          parallel=None, max_workers=None, **args):
     '''Replaces values in spreadsheet by standardized values following rules in data_config. 
-    Saves clean spreadsheet in clean_path and matching report in matching_path'''
+    Saves clean spreadsheet in clean_path and matching report in matching_path.
+    If mapping_store is the path to a mapping store file, values categorised in previous runs are
+    looked up there rather than categorised again.
+    The sheets are cleaned one after another unless parallel is set to 'process' (or 'thread'), in which
+    case they are cleaned in a pool of up to max_workers workers'''
+
+    # Read all the sheets in a single pass over the workbook
+    sheets = pd.read_excel(input_file, sheet_name=list(data_config))
+    tasks = [(item, sheets.pop(item), data_config[item], mapping_store) for item in data_config]
+    results = map_ordered(clean_sheet, tasks, parallel=parallel, max_workers=max_workers)
     
     # Set up two workbooks to write both clean spreadsheet and matching report in unique spreadsheets
     writer_clean = pd.ExcelWriter(output_file, engine='xlsxwriter') # create object to store clean data
-    wb = Workbook() # create object to store matching report
-    ws_ref = wb.active
-    ws_ref.title = "References" # This sheet will hold the validation references
-    reference_count = 0 #keep track of the columns filled with validation references
-    references = pd.DataFrame()
+    report = MatchingReportWriter(matching_report_file) # create object to stream the matching report
     
-    # Run through sheets within spreadsheet (matching items in data_config)
-    for item in data_config:
-        data = pd.read_excel(input_file, sheet_name=item)
-        df = data.copy()
+    # Run through sheets within spreadsheet (matching items in data_config) in order
+    for item, (df, matches) in zip(data_config, results):
         settings = data_config[item]
-        # Create new sheet in matching report
-        ws = wb.create_sheet(item) 
-        # Create header
-        ws['A1'] = 'column'
-        ws['B1'] = 'former_value'
-        ws['C1'] = 'new_value'
-        for cell in ws['A'] + ws[1]:
-            cell.style = 'Pandas'
-            
-        # Run through config criteria for that sheet
-        for col in settings:
-            if df[df[col].notnull()].shape[0] > 0: # Only look at non-empty columns
-
-                # Map current value to match value
-                categorize = make_category(settings[col])
-                df[col] = df[col].str.strip()
-                unique = df[col].unique()
-                clean_series = pd.Series(unique).apply(categorize).tolist()
-                match = make_map(unique, clean_series)
-
-                # Replace values in sheet
-                df[col] = df[col].replace(match)
-
-                # Write combination of former - new values into match_report
-                match_report = pd.DataFrame({'former_value': list(match.keys()), 'new_value': list(match.values())})
-                match_report['column'] = col
-                match_report = match_report[['column', 'former_value', 'new_value']]
-                
-                # Write data validation options in 'References' worksheet ws_ref
-                reference_count += 1
-                options = [c["code"] for c in settings[col]]
-                column_name = '{} - {}'.format(item, col)
-                if reference_count == 1:
-                    references[column_name] = options
-                else:
-                    new_reference = pd.DataFrame({column_name:options})
-                    references = pd.concat([references, new_reference], axis=1)
-                
-                # Insert match_report dataframe to current worksheet
-                for r in dataframe_to_rows(match_report, index=False, header=None):
-                    ws.append(r)
-
-                # Create data validation object
-                validation_range = "References!${}$2:${}${}".format(get_column_letter(reference_count), 
-                                                                    get_column_letter(reference_count), 
-                                                                    len(options)+1)
-                dv = validation_from_list(validation_range)
-                ws.add_data_validation(dv)
-                
-                # Add cells from match_report to the data validation object
-                # Find position of first and last cells that will get the data validation rule in column C
-                last_cell = 'C{}'.format(len(ws['C']))
-                first_cell = 'C{}'.format(len(ws['C']) - len(match) + 1)
-                # Add cells
-                dv.add('{}:{}'.format(first_cell, last_cell))
-        
-        # Take out duplicates
-        df.drop_duplicates(inplace=True)
+        # Write combination of former - new values into the matching report, with the valid codes for each column
+        report.write_sheet(item, [(col, match, [c["code"] for c in settings[col]]) for col, match in matches])
         
         # Save cleaned sheet into excel sheet
         df.to_excel(writer_clean, sheet_name=item, index=False)
 
-    for r in dataframe_to_rows(references, index=False, header=True):
-        ws_ref.append(r)
-    
     # Save both reports
-    wb.save(matching_report_file)
+    report.save()
     writer_clean.save()
     
     # Done
@@ -1,4 +1,9 @@
+import logging
 import pandas as pd
+from fddc.datatables.dedupe import deduplicate
+from fddc.parallel import map_ordered
+
+logger = logging.getLogger('fddc.annex_a.custom_cleaner')
 
 # List of columns that cannot be duplicates
 no_duplicates = {
@@ -13,35 +18,66 @@ no_duplicates = {
 }
 
 
-def custom_clean(input_file, input_matching, output_file, data_config, **args):
+def load_matching(input_matching, items):
+    '''
+    Reads the matching report once and indexes it as {list: {column: {former value: new value}}}
+    '''
+    matching = pd.read_excel(input_matching, sheet_name=list(items))
+    index = {}
+    for item, df in matching.items():
+        index[item] = {col: dict(zip(rows.former_value, rows.new_value))
+                       for col, rows in df.groupby('column', sort=False)}
+    return index
+
+
+def replace_values(series, match):
+    '''
+    Replaces the values of series found in match, keeping all other values
+    '''
+    replaced = series.map(match)
+    return replaced.where(series.isin(list(match.keys())), series)
+
+
+def custom_clean_sheet(task):
+    '''
+    Applies the matching to a single list and removes duplicates, keeping the rows in their original order.
+    task is a tuple of (list name, dataframe, {column: {former value: new value}})
+    '''
+    item, data, matching = task
+
+    for col in data.columns: # Look at each column in our data
+        if col in matching: # If the column exists in the matching report i.e. has matching information
+            data[col] = replace_values(data[col], matching[col])
+
+    # Only keep duplicates with the least null values
+    data, stats = deduplicate(data, no_duplicates[item], keep='most_complete')
+    logger.info(f"Removed {stats.rows_dropped} duplicates from {item} for {stats.dropped.shape[0]} keys")
+
+    return data
+
+
+def custom_clean(input_file, input_matching, output_file, data_config, parallel=None, max_workers=None, **args):
     '''
     Cleans the input_file based on changes in the input_matching report
     Outputs the results in output_file
+    The lists are processed one after another unless parallel is set to 'process' (or 'thread'), in which
+    case they are processed in a pool of up to max_workers workers
     '''
     writer_clean = pd.ExcelWriter(output_file, engine='xlsxwriter') # create object to store clean data
-    
-    for item in data_config:
-        # Load data and matching information for each list
-        data = pd.read_excel(input_file, sheet_name=item)
-        matching = pd.read_excel(input_matching, sheet_name=item)
-
-        for col in data.columns: # Look at each column in our data
-            if col in matching.column.unique(): # If the column exists in the matching report i.e. has matching information
-                df = matching[matching.column == col]
-                match = dict(zip(df.former_value, df.new_value)) # Create dict of matching values
-                data[col] = data[col].replace(match)
-    
-        # Only keep duplicates with the least null values
-        data['null_values'] = data.isnull().sum(axis=1)
-        data = data.sort_values('null_values')
-        data.drop_duplicates(subset=no_duplicates[item], keep='first', inplace=True)
-        data.drop(labels='null_values', axis=1, inplace=True)
-        
+
+    # Load data and matching information for all lists
+    data = pd.read_excel(input_file, sheet_name=list(data_config))
+    matching = load_matching(input_matching, data_config)
+
+    tasks = [(item, data.pop(item), matching.get(item, {})) for item in data_config]
+    results = map_ordered(custom_clean_sheet, tasks, parallel=parallel, max_workers=max_workers)
+
+    for item, cleaned in zip(data_config, results):
         # Save cleaned sheet into excel sheet
-        data.to_excel(writer_clean, sheet_name=item, index=False)
-    
+        cleaned.to_excel(writer_clean, sheet_name=item, index=False)
+
     # Save cleaned Annex A
     writer_clean.save()
-    
+
     # Done
-    print('Done!')
\ No newline at end of file
+    print('Done!')
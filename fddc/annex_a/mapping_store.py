@@ -0,0 +1,115 @@
+import hashlib
+import json
+import logging
+import sqlite3
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+
+from fddc.annex_a.category_index import CategoryIndex
+
+logger = logging.getLogger('fddc.annex_a.mapping_store')
+
+
+def config_hash(config: Any) -> str:
+    """
+    Returns a stable hash of a column's category configuration
+    """
+    serialised = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.sha256(serialised.encode('utf-8')).hexdigest()
+
+
+class MappingStore:
+    """
+    An on-disk (SQLite) store of values that have already been categorised, so that repeated cleaning runs only
+    categorise values they have not seen before.
+
+    Mappings are keyed on a hash of the column's category configuration, so they are shared by columns with the
+    same configuration and are discarded when a column's configuration changes.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.__connection = sqlite3.connect(filename, timeout=60)
+        with self.__connection:
+            self.__connection.execute(
+                "CREATE TABLE IF NOT EXISTS mappings "
+                "(config_hash TEXT NOT NULL, value TEXT NOT NULL, code TEXT NOT NULL, PRIMARY KEY (config_hash, value))"
+            )
+            self.__connection.execute(
+                "CREATE TABLE IF NOT EXISTS columns "
+                "(list TEXT NOT NULL, column TEXT NOT NULL, config_hash TEXT NOT NULL, PRIMARY KEY (list, column))"
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.__connection.close()
+
+    def register(self, list_name: str, column: str, config: Any) -> str:
+        """
+        Records the configuration used for a column, discarding mappings made with a previous configuration
+        that no other column uses.
+
+        :return: the configuration hash
+        """
+        current_hash = config_hash(config)
+        with self.__connection:
+            row = self.__connection.execute("SELECT config_hash FROM columns WHERE list = ? AND column = ?",
+                                            (list_name, column)).fetchone()
+            if row is not None and row[0] != current_hash:
+                logger.info(f"Configuration for '{list_name} - {column}' has changed - discarding stored mappings")
+                self.__connection.execute("UPDATE columns SET config_hash = ? WHERE list = ? AND column = ?",
+                                          (current_hash, list_name, column))
+                self.__connection.execute(
+                    "DELETE FROM mappings WHERE config_hash = ? "
+                    "AND NOT EXISTS (SELECT 1 FROM columns WHERE columns.config_hash = mappings.config_hash)",
+                    (row[0],))
+            elif row is None:
+                self.__connection.execute("INSERT INTO columns (list, column, config_hash) VALUES (?, ?, ?)",
+                                          (list_name, column, current_hash))
+        return current_hash
+
+    def lookup(self, hash_value: str) -> Dict[str, str]:
+        """
+        Returns all stored mappings for a configuration hash
+        """
+        rows = self.__connection.execute("SELECT value, code FROM mappings WHERE config_hash = ?", (hash_value,))
+        return dict(rows.fetchall())
+
+    def update(self, hash_value: str, mapping: Dict[str, str]):
+        """
+        Stores new mappings for a configuration hash. Only string values are stored.
+        """
+        with self.__connection:
+            self.__connection.executemany(
+                "INSERT OR REPLACE INTO mappings (config_hash, value, code) VALUES (?, ?, ?)",
+                [(hash_value, value, code) for value, code in mapping.items() if isinstance(value, str)]
+            )
+
+    def categorise(self, list_name: str, column: str, config: List[Dict[str, Any]], values: Iterable[Any]) -> List[str]:
+        """
+        Categorises values as :meth:`fddc.annex_a.category_index.CategoryIndex.categorise` does, using the stored
+        mappings where possible and storing any new ones.
+        """
+        values = list(values)
+        hash_value = self.register(list_name, column, config)
+        known = self.lookup(hash_value)
+
+        missing = [ix for ix, value in enumerate(values) if not (isinstance(value, str) and value in known)]
+        logger.debug(f"Found {len(values) - len(missing)} of {len(values)} values for '{list_name} - {column}' "
+                     f"in mapping store")
+
+        result = [known.get(value) if isinstance(value, str) else None for value in values]
+        if len(missing) > 0:
+            missing_values = [values[ix] for ix in missing]
+            codes = CategoryIndex(config).categorise(np.array(missing_values, dtype=object)).tolist()
+            for ix, code in zip(missing, codes):
+                result[ix] = code
+            self.update(hash_value, dict(zip(missing_values, codes)))
+
+        return result
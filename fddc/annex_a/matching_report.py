@@ -0,0 +1,84 @@
+import itertools
+import logging
+from typing import Any, Dict, Iterable, List, Tuple
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils.cell import get_column_letter
+from openpyxl.worksheet.datavalidation import DataValidation
+
+logger = logging.getLogger('fddc.annex_a.matching_report')
+
+
+def validation_from_list(validation_range):
+    '''Creates a data validation object based on validation_range (cell range to point to).'''
+    validation = DataValidation(type='list', formula1=validation_range)
+    validation.error = 'Your entry is not in the list'
+    validation.errorTitle = 'Invalid Entry'
+    validation.prompt = 'Please select from the list'
+    validation.promptTitle = 'List Selection'
+
+    return validation
+
+
+class MatchingReportWriter:
+    '''
+    Writes the matching report produced by :func:`fddc.annex_a.cleaner.clean`.
+
+    The workbook is opened in write-only mode, so rows are streamed to disk as each sheet is written
+    rather than held in memory. The first sheet, 'References', holds the valid codes for each column
+    and is written in one pass when the report is saved. Each list gets a sheet of
+    column / former_value / new_value rows, with a dropdown on new_value pointing at its References column.
+    '''
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.__workbook = Workbook(write_only=True)
+        self.__references_sheet = self.__workbook.create_sheet("References")
+        self.__references: List[Tuple[str, List[Any]]] = []
+
+    def __header(self, sheet, values: Iterable[str]) -> List[WriteOnlyCell]:
+        cells = []
+        for value in values:
+            cell = WriteOnlyCell(sheet, value=value)
+            cell.style = 'Pandas'
+            cells.append(cell)
+        return cells
+
+    def write_sheet(self, name: str, matches: Iterable[Tuple[str, Dict[Any, Any], List[Any]]]):
+        '''
+        Writes the matches for a list to a new sheet.
+
+        :param name: the name of the list
+        :param matches: (column, {former value: new value}, valid codes) for each column that was cleaned
+        '''
+        sheet = self.__workbook.create_sheet(name)
+        sheet.append(self.__header(sheet, ['column', 'former_value', 'new_value']))
+        row_count = 1
+
+        for col, match, options in matches:
+            for former_value, new_value in match.items():
+                sheet.append([col, former_value, new_value])
+
+            # Record the valid codes for the 'References' sheet
+            self.__references.append(('{} - {}'.format(name, col), list(options)))
+            reference_column = get_column_letter(len(self.__references))
+
+            # Add the rows just written to a data validation pointing at the codes
+            validation_range = "References!${}$2:${}${}".format(reference_column, reference_column, len(options) + 1)
+            dv = validation_from_list(validation_range)
+            dv.add('C{}:C{}'.format(row_count + 1, row_count + len(match)))
+            sheet.data_validations.append(dv)
+
+            row_count += len(match)
+
+    def save(self):
+        '''
+        Writes the 'References' sheet and saves the report
+        '''
+        self.__references_sheet.append([name for name, _ in self.__references])
+        for row in itertools.zip_longest(*[options for _, options in self.__references]):
+            self.__references_sheet.append(list(row))
+
+        logger.info(f"Writing matching report to {self.filename}")
+        self.__workbook.save(self.filename)
@@ -1,8 +1,9 @@
 import logging
 from dataclasses import dataclass
-from typing import List, Union, Dict, Tuple
-from fddc.annex_a.merger.configuration import ColumnConfig, SourceConfig, MatcherConfig
+from typing import Any, Callable, Iterable, List, Optional, Set, Union, Dict, Tuple
+from fddc.annex_a.merger.configuration import ColumnConfig, SourceConfig, MatcherConfig, RegexMatcherConfig
 from fddc.annex_a.merger.workbook_util import WorkSheetHeaderItem, WorkSheetDetail
+from fddc.regex import RegexSet
 
 
 logger = logging.getLogger('fddc.annex_a.merger.matcher')
@@ -57,22 +58,95 @@ def _match_header(header_list: List[WorkSheetHeaderItem], matcher_list: List[Mat
                 return header
 
 
-def match_columns(matched_sheet: Union[MatchedSheet, List[MatchedSheet]]) -> List[SheetWithHeaders]:
+def _first_matcher(matcher_list: List[MatcherConfig]) -> Callable[[Any], Optional[int]]:
+    """
+    Returns a function giving the position of the first matcher in matcher_list that matches a value
+    """
+    if all(isinstance(m, RegexMatcherConfig) for m in matcher_list):
+        return RegexSet([m.pattern for m in matcher_list]).match_index
+
+    def first_matcher(value):
+        for ix, matcher in enumerate(matcher_list):
+            if matcher.match(value):
+                return ix
+        return None
+    return first_matcher
+
+
+class ColumnMatchIndex:
+    """
+    Matches sheet headers to the columns of a single data source as :func:`_match_header` does, but with the
+    matchers of each column compiled once and the result for each distinct header value remembered. Header names
+    that repeat across sheets and files are only matched once.
+    """
+
+    def __init__(self, source_config: SourceConfig):
+        self.source_config = source_config
+        self.__first_matchers = [_first_matcher(c.matchers) for c in source_config.columns]
+        self.__cache: Dict[Any, List[Tuple[int, int]]] = {}
+
+    def header_matches(self, value: Any) -> List[Tuple[int, int]]:
+        """
+        Returns (column position, matcher position) for each column with a matcher that matches value
+        """
+        try:
+            return self.__cache[value]
+        except KeyError:
+            pass
+        matches = []
+        for column_ix, first_matcher in enumerate(self.__first_matchers):
+            matcher_ix = first_matcher(value)
+            if matcher_ix is not None:
+                matches.append((column_ix, matcher_ix))
+        self.__cache[value] = matches
+        return matches
+
+    def match_headers(self, header_list: List[WorkSheetHeaderItem]) -> List[Optional[WorkSheetHeaderItem]]:
+        """
+        Returns the matched header for each column, or None for columns without a match
+        """
+        # The first matcher wins, then the first header it matches
+        best: Dict[int, Tuple[int, WorkSheetHeaderItem]] = {}
+        for header in header_list:
+            for column_ix, matcher_ix in self.header_matches(header.value):
+                if column_ix not in best or matcher_ix < best[column_ix][0]:
+                    best[column_ix] = (matcher_ix, header)
+        return [best[ix][1] if ix in best else None for ix in range(len(self.source_config.columns))]
+
+
+def match_columns(
+        matched_sheet: Union[MatchedSheet, List[MatchedSheet]],
+        match_indexes: Dict[int, ColumnMatchIndex] = None
+) -> List[SheetWithHeaders]:
+    """
+    Matches the headers of each sheet to the columns of its data source.
+
+    :param matched_sheet: a sheet or list of sheets
+    :param match_indexes: optional indexes by data source (keyed by id) to reuse between calls
+    :return: the sheets with their matched and unmatched columns
+    """
+    if match_indexes is None:
+        match_indexes = {}
+
     # First we check if we were passed a list, in which case we iterate
     if not isinstance(matched_sheet, MatchedSheet):
         sheet_list = []  # type: List[SheetWithHeaders]
         for m in matched_sheet:
-            sheet_list += match_columns(m)
+            sheet_list += match_columns(m, match_indexes)
         return sheet_list
 
     # Otherwise we're working on a single sheet
+    source_config = matched_sheet.source_config
+    index = match_indexes.get(id(source_config))
+    if index is None or index.source_config is not source_config:
+        index = match_indexes[id(source_config)] = ColumnMatchIndex(source_config)
+
     matched_columns: List[MatchedColumn] = []
     unmatched_columns: List[ColumnConfig] = []
 
     # Loop over each configured column and try to identify candidate column
-    for column_config in matched_sheet.source_config.columns:
-        matched_header = _match_header(matched_sheet.sheet_detail.headers,
-                                       column_config.matchers)
+    matched_headers = index.match_headers(matched_sheet.sheet_detail.headers)
+    for column_config, matched_header in zip(source_config.columns, matched_headers):
         if matched_header is None:
             unmatched_columns.append(column_config)
         else:
@@ -84,12 +158,34 @@ def match_columns(matched_sheet: Union[MatchedSheet, List[MatchedSheet]]) -> Lis
                              )]
 
 
-def _does_sheet_match(source_config: SourceConfig, sheetname: str):
-    """ Returns True if sheetname is matched by any of the matchers in source_config """
-    for matcher in source_config.matchers:
-        if matcher.match(sheetname):
-            return True
-    return False
+def classify_sheet_names(
+        sheet_names: Iterable[str],
+        source_configuration_list: List[SourceConfig]
+) -> Tuple[Dict[str, SourceConfig], Set[str]]:
+    """
+    Finds the data source for each distinct sheet name - the first source with a matcher that matches the name.
+
+    The matchers of all sources are compiled into a single ordered set, so each distinct name is classified with one
+    scan.
+
+    :return: the data source for each matched name, and the names that were not matched
+    """
+    matchers = []  # type: List[MatcherConfig]
+    sources = []  # type: List[SourceConfig]
+    for source_configuration in source_configuration_list:
+        matchers += source_configuration.matchers
+        sources += [source_configuration] * len(source_configuration.matchers)
+    first_matcher = _first_matcher(matchers)
+
+    classified = {}  # type: Dict[str, SourceConfig]
+    unmatched = set()  # type: Set[str]
+    for sheet_name in set(sheet_names):
+        ix = first_matcher(sheet_name)
+        if ix is None:
+            unmatched.add(sheet_name)
+        else:
+            classified[sheet_name] = sources[ix]
+    return classified, unmatched
 
 
 def match_data_sources(
@@ -101,15 +197,16 @@ def match_data_sources(
 
         Returns the matched entries combined with the matching source.
     """
-    matched_sheets = []  # type: List[MatchedSheet]
-    unmatched_sheets = list(sheet_detail_list)  # type: List[WorkSheetDetail]
+    classified, _ = classify_sheet_names((s.sheetname for s in sheet_detail_list), source_configuration_list)
 
+    matched_sheets = []  # type: List[MatchedSheet]
+    unmatched_sheets = []  # type: List[WorkSheetDetail]
     for sheet_detail in sheet_detail_list:
-        for source_configuration in source_configuration_list:
-            if _does_sheet_match(source_configuration, sheet_detail.sheetname):
-                matched_sheets.append(MatchedSheet(source_config=source_configuration, sheet_detail=sheet_detail))
-                unmatched_sheets.remove(sheet_detail)
-                break
+        source_configuration = classified.get(sheet_detail.sheetname)
+        if source_configuration is None:
+            unmatched_sheets.append(sheet_detail)
+        else:
+            matched_sheets.append(MatchedSheet(source_config=source_configuration, sheet_detail=sheet_detail))
 
     for sheet in unmatched_sheets:
         logger.warning(
@@ -3,7 +3,7 @@ import re
 from typing import Union, List, Iterable, Tuple, Dict, Any
 import dacite
 import pandas as pd
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from openpyxl import Workbook
 from openpyxl.utils import get_column_letter
 from openpyxl.worksheet.table import Table, TableStyleInfo
@@ -12,7 +12,7 @@ from fddc.annex_a.merger import file_scanner, workbook_util, matcher
 from fddc.annex_a.merger.matcher import MatchedColumn, MatchedSheet, SheetWithHeaders
 from fddc.annex_a.merger.configuration import SourceConfig
 from fddc.annex_a.merger.file_scanner import ScanSource, FileSource
-from fddc.annex_a.merger.workbook_util import WorkSheetDetail
+from fddc.annex_a.merger.workbook_util import WorkSheetDetail, WorkSheetHeaderItem
 
 logger = logging.getLogger('fddc.annex_a.merger.matcher_report')
 
@@ -73,6 +73,49 @@ def parse_report(report: Union[str, pd.DataFrame]) -> List[MatchInput]:
     return match_input
 
 
+class _WorksheetIndex:
+    """
+    Scans each file once and indexes its sheets by name, and the headers of each sheet by value
+    """
+
+    def __init__(self):
+        self.__worksheets: Dict[str, List[WorkSheetDetail]] = {}
+        self.__sheets: Dict[str, Dict[str, WorkSheetDetail]] = {}
+        self.__headers: Dict[Tuple[str, str], Dict[Any, WorkSheetHeaderItem]] = {}
+
+    def worksheets(self, file: FileSource) -> List[WorkSheetDetail]:
+        worksheets = self.__worksheets.get(file.filename)
+        if worksheets is None:
+            worksheets = self.__worksheets[file.filename] = workbook_util.find_worksheets(FileSource(file.filename))
+        return [replace(w, sort_key=file.sort_key) for w in worksheets]
+
+    def sheet(self, file: FileSource, sheetname: str) -> WorkSheetDetail:
+        sheets = self.__sheets.get(file.filename)
+        if sheets is None:
+            sheets = self.__sheets[file.filename] = _first_by(self.worksheets(FileSource(file.filename)),
+                                                              lambda w: w.sheetname)
+        if sheetname not in sheets:
+            raise ValueError(f"Sheet '{sheetname}' not found in '{file.filename}'")
+        return replace(sheets[sheetname], sort_key=file.sort_key)
+
+    def header(self, file: FileSource, sheetname: str, header_name: Any) -> WorkSheetHeaderItem:
+        headers = self.__headers.get((file.filename, sheetname))
+        if headers is None:
+            headers = self.__headers[(file.filename, sheetname)] = _first_by(self.sheet(file, sheetname).headers,
+                                                                              lambda h: h.value)
+        if header_name not in headers:
+            raise ValueError(f"Header '{header_name}' not found in sheet '{sheetname}' of '{file.filename}'")
+        return headers[header_name]
+
+
+def _first_by(items: Iterable[Any], key) -> Dict[Any, Any]:
+    """ Indexes items by key, keeping the first item for each key """
+    index = {}
+    for item in items:
+        index.setdefault(key(item), item)
+    return index
+
+
 def process_report(
         match_input: Union[Iterable[MatchInput], pd.DataFrame, str],
         data_sources: List[SourceConfig]
@@ -80,7 +123,7 @@ def process_report(
     if isinstance(match_input, str) or isinstance(match_input, pd.DataFrame):
         match_input = parse_report(match_input)
 
-    files_to_scan = set()
+    files_to_scan = dict()
     columns_per_table = dict()
     mapping_dict: Dict[Tuple, List[MatchInput]] = dict()
 
@@ -92,7 +135,7 @@ def process_report(
                 sort_key = [f'/.*/{input.sort_key}/']
             scan_source = ScanSource(include=input.filename, sort_keys=sort_key)
             files = file_scanner.find_input_files(scan_source)
-            files_to_scan.update(files)
+            files_to_scan.update(dict.fromkeys(files))
         else:
             # Then we build a lookup of files and tables to see if any tables have no columns listed
             key = (input.filename, input.sort_key, input.sheetname, input.table)
@@ -104,11 +147,21 @@ def process_report(
             key = (input.filename, input.sort_key, input.sheetname, input.table)
             mapping_dict.setdefault(key, []).append(input)
 
+    # Each file is scanned at most once, and sheets, data sources, columns and headers are looked up by name
+    worksheet_index = _WorksheetIndex()
+    sources_by_name = _first_by(data_sources, lambda d: d.name)
+    columns_by_name = {name: _first_by(d.columns, lambda c: c.name) for name, d in sources_by_name.items()}
+
+    def source_config(table: str) -> SourceConfig:
+        if table not in sources_by_name:
+            raise ValueError(f"Unknown table '{table}'")
+        return sources_by_name[table]
+
     matched_list: List[MatchedSheet] = []
     unmatched_list: List[WorkSheetDetail] = []
 
     for file in files_to_scan:
-        worksheets = workbook_util.find_worksheets(file)
+        worksheets = worksheet_index.worksheets(file)
         # Match datasources based on configuration
         matched, unmatched = matcher.match_data_sources(worksheets, data_sources)
         matched_list += matched
@@ -118,10 +171,8 @@ def process_report(
         if len(columns) == 0:
             file, sort_key, sheetname, table = key
             if table is not None:
-                worksheet_list = workbook_util.find_worksheets(FileSource(file, sort_key=sort_key))
-                worksheet = next(iter([w for w in worksheet_list if w.sheetname == sheetname]))
-                source_config = next(iter([d for d in data_sources if d.name == table]))
-                matched = MatchedSheet(sheet_detail=worksheet, source_config=source_config)
+                worksheet = worksheet_index.sheet(FileSource(file, sort_key=sort_key), sheetname)
+                matched = MatchedSheet(sheet_detail=worksheet, source_config=source_config(table))
                 matched_list.append(matched)
 
     # Match headers to column configuration
@@ -129,16 +180,17 @@ def process_report(
 
     for key, mapping_list in mapping_dict.items():
         file, sort_key, sheetname, table = key
-        worksheet_list = workbook_util.find_worksheets(FileSource(file, sort_key=sort_key))
-        sheet_detail = next(iter([w for w in worksheet_list if w.sheetname == sheetname]))
-        source_config = next(iter([d for d in data_sources if d.name == table]))
-        sheet = MatchedSheet(sheet_detail=sheet_detail, source_config=source_config)
+        file_source = FileSource(file, sort_key=sort_key)
+        sheet_detail = worksheet_index.sheet(file_source, sheetname)
+        sheet = MatchedSheet(sheet_detail=sheet_detail, source_config=source_config(table))
 
         column_list: List[MatchedColumn] = []
 
         for mapping in mapping_list:
-            column_config = next(iter([c for c in source_config.columns if c.name == mapping.column_name]))
-            header_config = next(iter([h for h in sheet_detail.headers if h.value == mapping.header_name]))
+            column_config = columns_by_name[table].get(mapping.column_name)
+            if column_config is None:
+                raise ValueError(f"Unknown column '{mapping.column_name}' in table '{table}'")
+            header_config = worksheet_index.header(file_source, sheetname, mapping.header_name)
             column = MatchedColumn(column=column_config, header=header_config)
             column_list.append(column)
 
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from fddc.annex_a.merger.configuration import SourceConfig
+from fddc.annex_a.merger.matcher import SheetWithHeaders
+from fddc.datatables.cache import file_key, read_frame, write_frame
+
+logger = logging.getLogger('fddc.annex_a.merger.merge_state')
+
+
+def source_id(source: SheetWithHeaders) -> str:
+    detail = source.sheet.sheet_detail
+    return json.dumps([os.path.abspath(detail.filename), detail.sheetname])
+
+
+def source_fingerprint(source: SheetWithHeaders) -> str:
+    """
+    Returns a fingerprint of everything that determines the rows loaded from a source: the version of the file on
+    disk, the header row, the sort key and the mapping of headers to columns
+    """
+    detail = source.sheet.sheet_detail
+    serialised = json.dumps([file_key(detail.filename), detail.header_row_index, detail.sort_key,
+                             sorted(source.column_map().items(), key=str)], default=str)
+    return hashlib.sha256(serialised.encode('utf-8')).hexdigest()
+
+
+def config_fingerprint(config: SourceConfig) -> str:
+    serialised = json.dumps(asdict(config), sort_keys=True, default=str)
+    return hashlib.sha256(serialised.encode('utf-8')).hexdigest()
+
+
+class MergeState:
+    """
+    Keeps the merged table for each data source on disk together with a manifest of the sources it was built from,
+    so that a later merge only needs to load sources that have been added since.
+
+    The stored tables keep the sort key of the most recent row for each key, so new sources can be merged into them
+    with the same unique column semantics as a full merge. This is only valid when every new source sorts after all
+    the stored ones - if a source has changed or been removed, the configuration has changed, or a new source does
+    not have a later sort key, the table is rebuilt from all sources.
+
+    The tables are stored as Feather files with :func:`~fddc.datatables.cache.write_frame`, so this requires pyarrow.
+    """
+
+    MANIFEST = "manifest.json"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.__manifest_file = os.path.join(directory, self.MANIFEST)
+        if os.path.exists(self.__manifest_file):
+            with open(self.__manifest_file, "rt") as file:
+                self.__manifest: Dict[str, Any] = json.load(file)
+        else:
+            self.__manifest = {}
+
+    def __table_file(self, name: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(name.encode('utf-8')).hexdigest()[:16] + ".feather")
+
+    def plan(
+            self,
+            config: SourceConfig,
+            sources: List[SheetWithHeaders]
+    ) -> Tuple[Optional[pd.DataFrame], List[SheetWithHeaders]]:
+        """
+        Returns the stored table to merge into - None if the table must be rebuilt - and the sources to load
+        """
+        entry = self.__manifest.get(config.name)
+        if entry is None:
+            return None, sources
+        if entry["config"] != config_fingerprint(config):
+            logger.info(f"Configuration for {config.name} has changed - rebuilding")
+            return None, sources
+
+        current = {source_id(s): s for s in sources}
+        for stored_id, fingerprint in entry["sources"].items():
+            if stored_id not in current:
+                logger.info(f"A source for {config.name} has been removed - rebuilding")
+                return None, sources
+            if source_fingerprint(current[stored_id]) != fingerprint:
+                logger.info(f"A source for {config.name} has changed - rebuilding")
+                return None, sources
+
+        new_sources = [s for s in sources if source_id(s) not in entry["sources"]]
+        max_sort_key = entry["max_sort_key"]
+        for source in new_sources:
+            sort_key = source.sheet.sheet_detail.sort_key
+            if len(entry["sources"]) == 0:
+                break
+            if max_sort_key is None or sort_key is None or not sort_key > max_sort_key:
+                logger.info(f"A new source for {config.name} does not sort after the existing sources - rebuilding")
+                return None, sources
+
+        table_file = self.__table_file(config.name)
+        if not os.path.exists(table_file):
+            return None, sources
+        df = read_frame(table_file)
+
+        logger.info(f"Loaded {df.shape[0]} merged rows for {config.name} - {len(new_sources)} new sources")
+        return df, new_sources
+
+    def save(self, config: SourceConfig, sources: List[SheetWithHeaders], df: pd.DataFrame):
+        """
+        Stores the merged table for config built from sources
+        """
+        write_frame(df, self.__table_file(config.name), compression='lz4')
+
+        sort_keys = [s.sheet.sheet_detail.sort_key for s in sources]
+        self.__manifest[config.name] = dict(
+            config=config_fingerprint(config),
+            sources={source_id(s): source_fingerprint(s) for s in sources},
+            max_sort_key=None if None in sort_keys or len(sort_keys) == 0 else max(sort_keys),
+        )
+        self.__write(self.__manifest_file, json.dumps(self.__manifest, indent=2).encode('utf-8'))
+
+    def __write(self, filename: str, data: bytes):
+        # Write to a temporary file first so that an interrupted merge never leaves a partial file
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as file:
+                file.write(data)
+            os.replace(temporary, filename)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
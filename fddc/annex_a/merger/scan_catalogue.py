@@ -0,0 +1,197 @@
+import datetime
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from fddc.annex_a.merger import workbook_util
+from fddc.annex_a.merger.file_scanner import FileSource
+from fddc.annex_a.merger.workbook_util import WorkSheetDetail, WorkSheetHeaderItem
+
+logger = logging.getLogger('fddc.annex_a.merger.scan_catalogue')
+
+
+def content_hash(filename: str, chunk_size: int = 2 ** 20) -> str:
+    """
+    Returns the sha256 hash of the contents of a file
+    """
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _stat(filename: str) -> Optional[os.stat_result]:
+    try:
+        return os.stat(filename)
+    except OSError:
+        return None
+
+
+def _encode_value(value: Any) -> Any:
+    # Header cells are nearly always text, but openpyxl returns dates as datetimes
+    if isinstance(value, datetime.datetime):
+        return {'datetime': value.isoformat()}
+    elif isinstance(value, datetime.date):
+        return {'date': value.isoformat()}
+    elif isinstance(value, datetime.time):
+        return {'time': value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if 'datetime' in value:
+            return datetime.datetime.fromisoformat(value['datetime'])
+        elif 'date' in value:
+            return datetime.date.fromisoformat(value['date'])
+        elif 'time' in value:
+            return datetime.time.fromisoformat(value['time'])
+    return value
+
+
+def encode_headers(headers: List[WorkSheetHeaderItem]) -> str:
+    return json.dumps([[_encode_value(h.value), h.column_index] for h in headers])
+
+
+def decode_headers(headers: str) -> List[WorkSheetHeaderItem]:
+    return [WorkSheetHeaderItem(value=_decode_value(value), column_index=column_index)
+            for value, column_index in json.loads(headers)]
+
+
+class ScanCatalogue:
+    """
+    An on-disk (SQLite) catalogue of the sheets and header rows found in each workbook, so that repeated calls to
+    :func:`~fddc.annex_a.merger.find_sources` only scan files that are new or have changed.
+
+    Files are identified by their path, size and modification time. If the size or modification time has changed
+    the contents are hashed, so a file that has only been touched or copied over with the same contents is not
+    scanned again.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.__connection = sqlite3.connect(filename, timeout=60)
+        with self.__connection:
+            self.__connection.execute(
+                "CREATE TABLE IF NOT EXISTS files "
+                "(path TEXT NOT NULL PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+                "content_hash TEXT NOT NULL, header_window INTEGER NOT NULL)"
+            )
+            self.__connection.execute(
+                "CREATE TABLE IF NOT EXISTS sheets "
+                "(path TEXT NOT NULL, position INTEGER NOT NULL, sheetname TEXT NOT NULL, "
+                "header_row_index INTEGER NOT NULL, headers TEXT NOT NULL, PRIMARY KEY (path, position))"
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.__connection.close()
+
+    def lookup(self, source: FileSource, header_window: int) -> Optional[List[WorkSheetDetail]]:
+        """
+        Returns the catalogued sheets for source, or None if the file is not catalogued, has changed or was scanned
+        with a different header window
+        """
+        path = os.path.abspath(source.filename)
+        row = self.__connection.execute(
+            "SELECT size, mtime_ns, content_hash, header_window FROM files WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return None
+
+        size, mtime_ns, stored_hash, stored_window = row
+        if stored_window != header_window:
+            return None
+
+        stat = _stat(path)
+        if stat is None:
+            return None
+        if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+            if stat.st_size != size or content_hash(path) != stored_hash:
+                return None
+            logger.debug(f"{path} has been modified but its contents are unchanged")
+            with self.__connection:
+                self.__connection.execute("UPDATE files SET mtime_ns = ? WHERE path = ?", (stat.st_mtime_ns, path))
+
+        sheets = self.__connection.execute(
+            "SELECT sheetname, header_row_index, headers FROM sheets WHERE path = ? ORDER BY position", (path,))
+        return [WorkSheetDetail(**asdict(source), sheetname=sheetname, header_row_index=header_row_index,
+                                headers=decode_headers(headers))
+                for sheetname, header_row_index, headers in sheets.fetchall()]
+
+    def update(self, source: FileSource, header_window: int, worksheets: List[WorkSheetDetail],
+               stat: os.stat_result = None):
+        """
+        Stores the sheets found in source, replacing any previous entry.
+
+        :param stat: the file status from before the file was scanned - if the file changes while it is being scanned
+                     the entry will then be out of date and the file scanned again next time
+        """
+        path = os.path.abspath(source.filename)
+        if stat is None:
+            stat = os.stat(path)
+        with self.__connection:
+            self.__connection.execute("DELETE FROM sheets WHERE path = ?", (path,))
+            self.__connection.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, content_hash, header_window) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime_ns, content_hash(path), header_window))
+            self.__connection.executemany(
+                "INSERT INTO sheets (path, position, sheetname, header_row_index, headers) VALUES (?, ?, ?, ?, ?)",
+                [(path, ix, ws.sheetname, ws.header_row_index, encode_headers(ws.headers))
+                 for ix, ws in enumerate(worksheets)])
+
+    def scan_workbooks(
+            self,
+            files: Sequence[FileSource],
+            header_window: int = workbook_util.DEFAULT_HEADER_WINDOW,
+            **options
+    ) -> Tuple[List[WorkSheetDetail], List[Tuple[FileSource, Exception]]]:
+        """
+        Returns the sheets in each file as :func:`~fddc.annex_a.merger.workbook_util.scan_workbooks` does, only
+        scanning the files that are not in the catalogue. Other options are passed on to
+        :func:`~fddc.annex_a.merger.workbook_util.scan_workbooks`.
+        """
+        results: Dict[int, List[WorkSheetDetail]] = {}
+        missing: List[int] = []
+        for ix, file in enumerate(files):
+            worksheets = self.lookup(file, header_window)
+            if worksheets is None:
+                missing.append(ix)
+            else:
+                results[ix] = worksheets
+
+        logger.info(f"Found {len(results)} of {len(files)} files in scan catalogue")
+
+        failed: List[Tuple[FileSource, Exception]] = []
+        if len(missing) > 0:
+            missing_files = list(dict.fromkeys(files[ix] for ix in missing))
+            stats = [_stat(file.filename) for file in missing_files]
+            scanned, failed = workbook_util.scan_workbooks(missing_files, header_window=header_window, **options)
+
+            by_file: Dict[FileSource, List[WorkSheetDetail]] = {file: [] for file in missing_files}
+            for ws in scanned:
+                by_file[FileSource(filename=ws.filename, sort_key=ws.sort_key)].append(ws)
+
+            failed_files = {file for file, error in failed}
+            for file, stat in zip(missing_files, stats):
+                if file not in failed_files and stat is not None:
+                    self.update(file, header_window, by_file[file], stat=stat)
+
+            for ix in missing:
+                if files[ix] not in failed_files:
+                    results[ix] = by_file[files[ix]]
+
+        worksheets: List[WorkSheetDetail] = []
+        for ix in range(len(files)):
+            worksheets += results.get(ix, [])
+        return worksheets, failed
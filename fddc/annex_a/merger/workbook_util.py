@@ -1,9 +1,15 @@
 import logging
+from contextlib import contextmanager
 from dataclasses import dataclass, asdict
-from typing import List, Any
+from functools import partial
+from typing import List, Any, Iterator, Sequence, Tuple, Union
+
+import openpyxl
+import xlrd
 
 from fddc.annex_a.merger.file_scanner import FileSource
 from fddc.datatables.cache import ExcelFileSource
+from fddc.parallel import map_ordered
 
 logger = logging.getLogger('fddc.annex_a.merger.workbook_util')
 
@@ -24,30 +30,113 @@ class WorkSheetDetail(FileSource):
         return [c.value for c in self.headers]
 
 
-def find_worksheets(source: FileSource, file_source: ExcelFileSource = ExcelFileSource()) -> List[WorkSheetDetail]:
+# Legacy .xls workbooks are OLE2 compound documents
+_XLS_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+DEFAULT_HEADER_WINDOW = 50
+""" The number of rows searched for a header row in each sheet """
+
+
+@contextmanager
+def open_workbook(filename: str):
+    """
+    Opens a workbook without loading any sheets - an openpyxl read-only workbook for Office Open XML files and an
+    on-demand xlrd workbook for legacy .xls files. The workbook is closed on exit.
+    """
+    with open(filename, 'rb') as file:
+        signature = file.read(len(_XLS_SIGNATURE))
+
+    if signature == _XLS_SIGNATURE:
+        workbook = xlrd.open_workbook(filename, on_demand=True)
+        try:
+            yield workbook
+        finally:
+            workbook.release_resources()
+    else:
+        workbook = openpyxl.load_workbook(filename, read_only=True, data_only=True, keep_links=False)
+        try:
+            yield workbook
+        finally:
+            workbook.close()
+
+
+def _sheet_names(workbook) -> List[str]:
+    if isinstance(workbook, xlrd.Book):
+        return workbook.sheet_names()
+    return workbook.sheetnames
 
-    data_sources = []  # type: List[WorkSheetDetail]
+
+def _sheet_rows(workbook, sheet_name: str, max_rows: int, unload: bool = False) -> Iterator[Sequence[Any]]:
+    """
+    Yields the values of at most max_rows rows from the top of the sheet. Empty cells are returned as ''.
+    """
+    if isinstance(workbook, xlrd.Book):
+        sheet = workbook.sheet_by_name(sheet_name)
+        try:
+            for ix in range(min(sheet.nrows, max_rows)):
+                yield sheet.row_values(ix)
+        finally:
+            if unload:
+                workbook.unload_sheet(sheet_name)
+    else:
+        sheet = workbook[sheet_name]
+        if not hasattr(sheet, 'iter_rows'):
+            # Chart sheets have no cells
+            return
+        for row in sheet.iter_rows(max_row=max_rows, values_only=True):
+            yield ['' if value is None else value for value in row]
+
+
+def _find_header(rows: Iterator[Sequence[Any]]):
+    """
+    Returns the 1-based index of the first row with more than 3 non-blank values and the values of that row.
+    If there is no such row, returns the index of the last non-blank row and no values.
+    """
+    header_row_index = 1
+    for ix, row in enumerate(rows):
+        row_length = 0
+        for value in row:
+            if value is not None and len(str(value).strip()) > 0:
+                header_row_index = ix + 1
+                row_length += 1
+        if row_length > 3:
+            return header_row_index, [WorkSheetHeaderItem(value=value, column_index=col_ix)
+                                      for col_ix, value in enumerate(row)]
+    return header_row_index, []
+
+
+def find_worksheets(
+        source: FileSource,
+        file_source: ExcelFileSource = None,
+        header_window: int = DEFAULT_HEADER_WINDOW
+) -> List[WorkSheetDetail]:
+    """
+    Finds the sheets in the source workbook and their header rows. The workbook is opened lazily and only the first
+    header_window rows of each sheet are read.
+
+    :param source: the workbook to scan
+    :param file_source: if provided, the workbook already opened by this source is scanned rather than opening it again
+    :param header_window: the maximum number of rows to search for a header in each sheet
+    :return: the details of each sheet
+    """
+    if file_source is not None:
+        logger.debug("Fetching {}".format(source.filename))
+        with file_source.open_file(source.filename) as file:
+            return _find_worksheets(source, file.book, header_window, unload=False)
 
     logger.debug("Opening {}".format(source.filename))
-    excel_file = file_source.get_file(source.filename)
-    workbook = excel_file.book
+    with open_workbook(source.filename) as workbook:
+        return _find_worksheets(source, workbook, header_window, unload=True)
+
+
+def _find_worksheets(source: FileSource, workbook, header_window: int, unload: bool) -> List[WorkSheetDetail]:
+    data_sources = []  # type: List[WorkSheetDetail]
 
-    for sheet_name in workbook.sheet_names():
+    for sheet_name in _sheet_names(workbook):
         logger.debug("Checking sheet {} in {}".format(sheet_name, source.filename))
-        sheet = workbook.sheet_by_name(sheet_name)
 
         # We search for first row with more than 3 non-null values
-        header_row_index = 1
-        header_values = []  # type: List[WorkSheetHeaderItem]
-        for ix, row in enumerate(sheet.get_rows()):
-            row_length = 0
-            for col in row:
-                if col.value is not None and len(str(col.value).strip()) > 0:
-                    header_row_index = ix + 1
-                    row_length += 1
-            if row_length > 3:
-                header_values = [WorkSheetHeaderItem(value=col.value, column_index=ix) for ix, col in enumerate(row)]
-                break
+        header_row_index, header_values = _find_header(_sheet_rows(workbook, sheet_name, header_window, unload))
 
         source_info = WorkSheetDetail(
             **asdict(source),
@@ -59,3 +148,40 @@ def find_worksheets(source: FileSource, file_source: ExcelFileSource = ExcelFile
         data_sources.append(source_info)
 
     return data_sources
+
+
+def scan_workbooks(
+        files: Sequence[FileSource],
+        file_source: ExcelFileSource = None,
+        header_window: int = DEFAULT_HEADER_WINDOW,
+        parallel: Union[bool, str] = None,
+        max_workers: int = None,
+) -> Tuple[List[WorkSheetDetail], List[Tuple[FileSource, Exception]]]:
+    """
+    Runs :func:`find_worksheets` on each file, optionally in a thread or process pool. A file that cannot be
+    scanned is logged and skipped rather than aborting the scan.
+
+    :param files: the workbooks to scan
+    :param file_source: see :func:`find_worksheets` - ignored when scanning in a process pool
+    :param header_window: see :func:`find_worksheets`
+    :param parallel: see :func:`fddc.parallel.create_executor`
+    :param max_workers: see :func:`fddc.parallel.create_executor`
+    :return: the details of all sheets, in file order, and the files that failed with their errors
+    """
+    if parallel is True or parallel == 'process':
+        # Open workbooks cannot be shared between processes
+        file_source = None
+
+    scan = partial(find_worksheets, file_source=file_source, header_window=header_window)
+    results = map_ordered(scan, files, parallel=parallel, max_workers=max_workers, return_exceptions=True)
+
+    worksheets = []  # type: List[WorkSheetDetail]
+    failed = []  # type: List[Tuple[FileSource, Exception]]
+    for file, result in zip(files, results):
+        if isinstance(result, Exception):
+            logger.error("Failed to scan {}: {}".format(file.filename, result))
+            failed.append((file, result))
+        else:
+            worksheets += result
+
+    return worksheets, failed
@@ -1,14 +1,21 @@
 import logging
-from typing import List, Union, Iterable
+import multiprocessing.util
+import os
+import threading
+import uuid
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union, Iterable
 import pandas as pd
 
 from fddc.annex_a.merger import file_scanner, workbook_util, matcher, matcher_report
-from fddc.annex_a.merger.configuration import SourceConfig
+from fddc.annex_a.merger.configuration import ColumnConfig, SourceConfig
+from fddc.annex_a.merger.merge_state import MergeState
 from fddc.annex_a.merger.file_scanner import FileSource, ScanSource
-from fddc.annex_a.merger.matcher import SheetWithHeaders
+from fddc.annex_a.merger.matcher import MatchedColumn, SheetWithHeaders
+from fddc.annex_a.merger.scan_catalogue import ScanCatalogue
 from fddc.annex_a.merger.workbook_util import WorkSheetDetail
-from fddc.datatables import load, normalise, merge
-from fddc.datatables.load import ExcelFileSource
+from fddc.datatables import load, normalise, merge, write
+from fddc.datatables.cache import DataFrameCache, ExcelFileSource
+from fddc.parallel import imap_ordered
 
 
 logger = logging.getLogger('fddc.annex_a.merger.workflow')
@@ -30,7 +37,11 @@ def find_sources(
         *args: Union[str, ScanSource, List],
         data_sources: List[SourceConfig],
         column_report_filename: str = None,
-        file_source: ExcelFileSource = ExcelFileSource()
+        file_source: ExcelFileSource = None,
+        header_window: int = workbook_util.DEFAULT_HEADER_WINDOW,
+        parallel: Union[bool, str] = None,
+        max_workers: int = None,
+        scan_catalogue: str = None
 ) -> List[SheetWithHeaders]:
     """
     Search the filesystem for sources and try to automatically discoverer tables and match columns.
@@ -39,7 +50,14 @@ def find_sources(
     :param data_sources: Configuration for tables and columns
     :param column_report_filename: Optional generation of a report summarising matches. This can be edited and
                                    fed back into :func:`~fddc.annex_a.merger.read_sources` function.
-    :param file_source:
+    :param file_source: Optional source of already opened workbooks to scan - by default each workbook is opened
+                        lazily and only the rows searched for headers are read
+    :param header_window: The maximum number of rows to search for a header in each sheet
+    :param parallel: Scan workbooks in a 'thread' or 'process' pool rather than one after another. Workbooks that
+                     cannot be scanned are logged and skipped in all modes.
+    :param max_workers: Maximum number of workers in the pool
+    :param scan_catalogue: Optional path to a catalogue file of previously scanned workbooks - only new and changed
+                           workbooks are scanned, and the results are added to the catalogue
     :return: discovered sources
     """
     input_files = __to_scan_source(args)
@@ -52,9 +70,16 @@ def find_sources(
     logger.info("Found {} candidate input files".format(len(files)))
 
     # We then scan the input files for data sources
-    file_sources: List[WorkSheetDetail] = []
-    for file in files:
-        file_sources += workbook_util.find_worksheets(file, file_source=file_source)
+    file_sources: List[WorkSheetDetail]
+    scan_options = dict(file_source=file_source, header_window=header_window, parallel=parallel,
+                        max_workers=max_workers)
+    if scan_catalogue is None:
+        file_sources, failed_files = workbook_util.scan_workbooks(files, **scan_options)
+    else:
+        with ScanCatalogue(scan_catalogue) as catalogue:
+            file_sources, failed_files = catalogue.scan_workbooks(files, **scan_options)
+    if len(failed_files) > 0:
+        logger.warning("Failed to scan {} of {} input files".format(len(failed_files), len(files)))
 
     logger.info("Found {} candidate data sources".format(len(file_sources)))
 
@@ -93,39 +118,222 @@ def read_sources(
     return sheet_with_headers
 
 
+_worker_state = threading.local()
+
+# The sources opened by the workers in this process for each merge run, so they can be closed once the run is done
+_worker_sources: Dict[str, List[ExcelFileSource]] = {}
+_worker_sources_pid = None
+_worker_sources_lock = threading.Lock()
+
+
+def _worker_file_source(run_id: str) -> ExcelFileSource:
+    """
+    Returns the workbooks opened by the current worker thread or process during the merge run_id, so that a worker
+    loading several sheets from the same workbook only opens it once
+    """
+    global _worker_sources_pid
+    if getattr(_worker_state, 'file_source_run', None) != run_id:
+        file_source = ExcelFileSource(max_files=2)
+        with _worker_sources_lock:
+            if _worker_sources_pid != os.getpid():
+                # A worker process closes its sources as it exits when the pool shuts down
+                _worker_sources_pid = os.getpid()
+                _worker_sources.clear()
+                multiprocessing.util.Finalize(None, _close_worker_sources, exitpriority=10)
+            _worker_sources.setdefault(run_id, []).append(file_source)
+        _worker_state.file_source_run = run_id
+        _worker_state.file_source = file_source
+    return _worker_state.file_source
+
+
+def _close_worker_sources(run_id: str = None):
+    """
+    Closes the sources opened by the workers of this process during the merge run_id, or during all runs if None
+    """
+    with _worker_sources_lock:
+        if run_id is None:
+            sources = [file_source for run_sources in _worker_sources.values() for file_source in run_sources]
+            _worker_sources.clear()
+        else:
+            sources = _worker_sources.pop(run_id, [])
+    for file_source in sources:
+        file_source.close()
+
+
+def _worker_date_formats(run_id: str) -> Dict:
+    """
+    Returns the date formats found by the current worker thread or process during the merge run_id. The formats
+    found during earlier merges are discarded.
+    """
+    if getattr(_worker_state, 'date_formats_run', None) != run_id:
+        _worker_state.date_formats_run = run_id
+        _worker_state.date_formats = {}
+    return _worker_state.date_formats
+
+
+def _release_worker_date_formats():
+    """
+    Discards the date formats kept by the current thread
+    """
+    _worker_state.date_formats_run = None
+    _worker_state.date_formats = None
+
+
+# Column types that are converted from whatever the cells hold, so there is no point in pandas inferring a type first
+_OBJECT_TYPES = ("int", "string", "bool")
+
+
+def _read_options(columns: Sequence[MatchedColumn] = None) -> Dict[str, Any]:
+    """
+    Returns the :func:`~fddc.datatables.load.load_dataframe` options to read only the matched columns of a sheet,
+    with dtype hints from their types
+
+    :param columns: the matched columns - if None all columns are read
+    :return: usecols and dtype options
+    """
+    if not columns:
+        return {}
+    usecols: List[int] = sorted({c.header.column_index for c in columns})
+    dtype: Optional[Dict[Any, Any]] = {c.header.value: object for c in columns if c.column.type in _OBJECT_TYPES}
+    return dict(usecols=usecols, dtype=dtype or None)
+
+
+def _load_source(task) -> Tuple[pd.DataFrame, "normalise.TypeCleaningReport"]:
+    """
+    Loads, normalises and type-cleans a single source sheet.
+    task is a tuple of (source, data source configuration, file source, dataframe cache, merge run id)
+    """
+    source, data_source_config, file_source, dataframe_cache, run_id = task
+    if file_source is None:
+        file_source = _worker_file_source(run_id)
+    detail = source.sheet.sheet_detail
+    df = load.load_dataframe(detail, file_source=file_source, dataframe_cache=dataframe_cache,
+                             **_read_options(source.columns))
+    # The loaded frame is not used again, so its columns can be shared rather than copied
+    df = normalise.normalise_dataframe(df, data_source_config.column_names(), source.column_map(), copy=False)
+    report = normalise.TypeCleaningReport(date_formats=_worker_date_formats(run_id))
+    df = normalise.clean_datatypes(df, data_source_config.columns, report=report, source=detail.filename)
+    df["sort_key"] = detail.sort_key
+    return df, report
+
+
 def merge_dataframes(
         sheet_with_headers: List[SheetWithHeaders],
         data_sources: List[SourceConfig],
         output_file: str = None,
-        file_source: ExcelFileSource = ExcelFileSource()
+        file_source: ExcelFileSource = None,
+        dataframe_cache: Union[str, DataFrameCache] = None,
+        parallel: Union[bool, str] = None,
+        max_workers: int = None,
+        max_pending: int = None,
+        merge_state: str = None,
+        type_report: "normalise.TypeCleaningReport" = None,
+        output_format: str = "xlsx"
 ):
+    """
+    Loads, normalises and merges the sheets for each data source, optionally writing them to output_file.
+
+    :param sheet_with_headers: the sheets to merge, as returned by :func:`find_sources` or :func:`read_sources`
+    :param data_sources: configuration for tables and columns
+    :param output_file: optional file to write the merged tables to - for formats other than xlsx, a directory to
+                        write a file per table to
+    :param file_source: optional source of open workbooks - by default workbooks are closed once merged
+    :param dataframe_cache: optional directory (or :class:`~fddc.datatables.cache.DataFrameCache`) to cache parsed
+                            sheets in, so that later merges of unchanged files do not parse them again.
+                            Requires pyarrow.
+    :param parallel: load sheets in a 'thread' or 'process' pool. Each table is merged and written as soon as its
+                     sheets are loaded, while the sheets of the following tables continue to load. Each worker opens
+                     its own workbooks, so file_source is not used.
+    :param max_workers: maximum number of workers in the pool
+    :param max_pending: maximum number of loaded sheets waiting to be merged, which bounds memory use - defaults to
+                        twice the number of workers
+    :param merge_state: optional directory to keep the merged tables in. Later merges only load the sources added
+                        since, as long as they sort after the existing ones - see
+                        :class:`~fddc.annex_a.merger.merge_state.MergeState`
+    :param type_report: optional report to collect the values that could not be converted to their column type
+    :param output_format: 'xlsx', 'csv', 'csv.gz', 'parquet' or 'feather' - see
+                          :func:`~fddc.datatables.write.create_writer`. Parquet and Feather require pyarrow.
+    """
+    if file_source is None and not parallel:
+        # Keep the workbooks open while they are merged and close them when done
+        with ExcelFileSource() as file_source:
+            return merge_dataframes(sheet_with_headers, data_sources, output_file, file_source, dataframe_cache,
+                                    merge_state=merge_state, type_report=type_report, output_format=output_format)
+
+    if parallel:
+        # Open workbooks cannot be shared between workers
+        file_source = None
+
+    if isinstance(dataframe_cache, str):
+        dataframe_cache = DataFrameCache(dataframe_cache)
+
+    # Filter the source list to give us only sources for each table
+    source_lists = [[s for s in sheet_with_headers if s.sheet.source_config.name == data_source_config.name]
+                    for data_source_config in data_sources]
+
+    # With a merge state, only the sources added since the stored tables were merged are loaded
+    state = None if merge_state is None else MergeState(merge_state)
+    stored_frames: List[Union[pd.DataFrame, None]] = []
+    load_lists: List[List[SheetWithHeaders]] = []
+    for data_source_config, source_list in zip(data_sources, source_lists):
+        stored, load_list = (None, source_list) if state is None else state.plan(data_source_config, source_list)
+        stored_frames.append(stored)
+        load_lists.append(load_list)
+
+    # The sheets are loaded in table order, so the results for each table arrive together
+    # Identifies this merge to the workers, so they only reuse the date formats found during it
+    run_id = uuid.uuid4().hex
+    tasks = ((source, data_source_config, file_source, dataframe_cache, run_id)
+             for data_source_config, load_list in zip(data_sources, load_lists)
+             for source in load_list)
+    loaded = imap_ordered(_load_source, tasks, parallel=parallel, max_workers=max_workers, max_pending=max_pending)
 
     writer = None
     if output_file is not None:
         logger.info("Writing to {}".format(output_file))
-        writer = pd.ExcelWriter(output_file, engine='xlsxwriter')
+        writer = write.create_writer(output_file, output_format)
 
-    for data_source_config in data_sources:
-        # Filter the source list to give us only sources for this table
-        source_list = [s for s in sheet_with_headers if s.sheet.source_config.name == data_source_config.name]
-        logger.info(f"Loading {len(source_list)} sources for {data_source_config.name}")
+    try:
+        for data_source_config, source_list, stored, load_list in zip(data_sources, source_lists, stored_frames,
+                                                                      load_lists):
+            logger.info(f"Loading {len(load_list)} sources for {data_source_config.name}")
 
-        if len(source_list) == 0:
-            # We just create an empty sheet
-            df = pd.DataFrame(columns=data_source_config.column_names())
-        else:
-            data_frames: List[pd.DataFrame] = []
-            for source in source_list:
-                df = load.load_dataframe(source.sheet.sheet_detail, file_source=file_source)
-                df = normalise.normalise_dataframe(df, data_source_config.column_names(), source.column_map())
-                df = normalise.clean_datatypes(df, data_source_config.columns)
-                df["sort_key"] = source.sheet.sheet_detail.sort_key
-                data_frames.append(df)
-            df = merge.merge_dataframes(data_frames, data_source_config.columns, sort_key="sort_key")
+            columns = data_source_config.columns
+            if state is not None:
+                # The stored table keeps the latest sort key for each row so that new rows can be merged into it
+                columns = columns + [ColumnConfig(name="sort_key")]
 
-        if writer is not None:
-            df.to_excel(writer, sheet_name=data_source_config.name, index=False)
+            data_frames: List[pd.DataFrame] = [] if stored is None else [stored]
+            for _ in load_list:
+                loaded_df, report = next(loaded)
+                data_frames.append(loaded_df)
+                if type_report is not None:
+                    type_report.extend(report)
+                del loaded_df
+
+            if len(data_frames) == 0:
+                # We just create an empty sheet
+                df = pd.DataFrame(columns=data_source_config.column_names())
+            elif len(load_list) == 0:
+                df = stored
+            else:
+                df = merge.merge_dataframes(data_frames, columns, sort_key="sort_key", categorise=True)
+            del data_frames
 
-    if writer is not None:
-        writer.save()
-        writer.close()
+            if state is not None:
+                if len(load_list) > 0 or stored is None:
+                    state.save(data_source_config, source_list, df)
+                if any(c.unique for c in data_source_config.columns):
+                    df = df[data_source_config.column_names()]
+
+            if writer is not None:
+                writer.write(data_source_config.name, df)
+    finally:
+        # Cancels the sheets still waiting to load and shuts the pool down if the merge failed
+        loaded.close()
+        if writer is not None:
+            writer.close()
+        if parallel == 'thread':
+            _close_worker_sources(run_id)
+        elif not parallel:
+            _release_worker_date_formats()
@@ -1,26 +1,397 @@
+import glob
+import hashlib
+import json
 import logging
+import datetime
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
 
+import numpy as np
 import pandas as pd
-from typing import Dict, Any
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 
 logger = logging.getLogger('fddc.datatables.cache')
 
+FileKey = Tuple[str, int, int]
+
+
+@dataclass(frozen=True, eq=True)
+class CacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    files: int
+    bytes: int
+
+
+def file_key(filename: str) -> FileKey:
+    """
+    Returns the key identifying the current version of a file on disk: the absolute path, modification time and size
+    """
+    stat = os.stat(filename)
+    return os.path.abspath(filename), stat.st_mtime_ns, stat.st_size
+
 
 class ExcelFileSource:
     """
-    A utility class for saving reloading of Excel files when reading multiple sheets
+    A utility class for saving reloading of Excel files when reading multiple sheets.
+
+    Files are cached per instance and keyed on their path, modification time and size, so a file that changes on disk
+    is opened again. The least recently used files are closed once there are more than max_files open, or once the
+    total size on disk of the open files exceeds max_bytes - the size on disk is only a rough guide to the memory
+    used by an open workbook.
+
+    The source can be used as a context manager to close all files on exit.
+
+    To share a source between threads, read files inside :meth:`open_file` rather than using :meth:`get_file`: a file
+    that is evicted or closed while another thread is still reading it is then only closed once that thread is done.
     """
-    __file_map: Dict[Any, pd.ExcelFile] = dict()
+
+    def __init__(self, max_files: int = 16, max_bytes: int = None):
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.__files: "OrderedDict[FileKey, pd.ExcelFile]" = OrderedDict()
+        self.__paths = dict()
+        self.__bytes = 0
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+        self.__lock = threading.RLock()
+        # The number of open_file blocks using each file, and the files to close when their last user is done - both
+        # keyed on id() as a file that was evicted can be opened again under the same key
+        self.__users: Dict[int, int] = {}
+        self.__retired: Dict[int, pd.ExcelFile] = {}
 
     def get_file(self, filename: str) -> pd.ExcelFile:
         """
-        Returns a cached or new ExcelFile if the filename has never been loaded before
+        Returns a cached or new ExcelFile if the filename has never been loaded before or has changed since
         :param filename:
         :return:
         """
-        if filename in self.__file_map:
-            logger.debug(f"Fetching {filename} from cache.")
-        else:
+        key = file_key(filename)
+        with self.__lock:
+            file = self.__files.get(key)
+            if file is not None:
+                logger.debug(f"Fetching {filename} from cache.")
+                self.__hits += 1
+                self.__files.move_to_end(key)
+                return file
+
+            stale_key = self.__paths.get(key[0])
+            if stale_key is not None:
+                logger.debug(f"{filename} has changed since it was opened.")
+                self.__evict(stale_key)
+
             logger.debug(f"Creating new ExcelFile for {filename}.")
-        return self.__file_map.setdefault(filename, pd.ExcelFile(filename))
+            self.__misses += 1
+            file = pd.ExcelFile(filename)
+            self.__files[key] = file
+            self.__paths[key[0]] = key
+            self.__bytes += key[2]
+
+            while len(self.__files) > 1 and self.__over_budget():
+                self.__evict(next(iter(self.__files)))
+
+            return file
+
+    @contextmanager
+    def open_file(self, filename: str) -> Iterator[pd.ExcelFile]:
+        """
+        Returns the file as :meth:`get_file` does, keeping it open until the block exits even if it is evicted
+        :param filename:
+        :return:
+        """
+        with self.__lock:
+            file = self.get_file(filename)
+            self.__users[id(file)] = self.__users.get(id(file), 0) + 1
+        try:
+            yield file
+        finally:
+            with self.__lock:
+                users = self.__users.pop(id(file)) - 1
+                if users > 0:
+                    self.__users[id(file)] = users
+                elif self.__retired.pop(id(file), None) is not None:
+                    logger.debug(f"Closing {filename} now that it is no longer used.")
+                    file.close()
+
+    def __close_file(self, file: pd.ExcelFile):
+        if id(file) in self.__users:
+            self.__retired[id(file)] = file
+        else:
+            file.close()
+
+    def __over_budget(self) -> bool:
+        if self.max_files is not None and len(self.__files) > self.max_files:
+            return True
+        return self.max_bytes is not None and self.__bytes > self.max_bytes
+
+    def __evict(self, key: FileKey):
+        logger.debug(f"Closing {key[0]}.")
+        file = self.__files.pop(key)
+        del self.__paths[key[0]]
+        self.__bytes -= key[2]
+        self.__evictions += 1
+        self.__close_file(file)
+
+    def stats(self) -> CacheStats:
+        with self.__lock:
+            return CacheStats(hits=self.__hits, misses=self.__misses, evictions=self.__evictions,
+                              files=len(self.__files), bytes=self.__bytes)
+
+    def close(self):
+        """
+        Closes all open files - files still used in an :meth:`open_file` block are closed when it exits
+        """
+        with self.__lock:
+            for file in self.__files.values():
+                self.__close_file(file)
+            self.__files.clear()
+            self.__paths.clear()
+            self.__bytes = 0
+
+    def __len__(self):
+        return len(self.__files)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.feather
+    except ImportError as e:
+        raise ImportError("The sheet cache and merge state require pyarrow - install it with 'pip install pyarrow'") \
+            from e
+    return pyarrow, pyarrow.feather
+
+
+# The types of value stored for object columns that Arrow cannot hold - each value is written as text with the
+# position of its type in this list, and parsed back from the text on reading
+_VALUE_TYPES = ("none", "str", "bool", "int", "float", "nat", "timestamp", "datetime", "date", "time")
+_VALUE_TYPE_CODES = {name: code for code, name in enumerate(_VALUE_TYPES)}
+
+
+def _parse_time(text: str) -> datetime.time:
+    return datetime.datetime.strptime(text, "%H:%M:%S.%f" if "." in text else "%H:%M:%S").time()
+
+
+_VALUE_PARSERS: Dict[str, Callable[[str], Any]] = {
+    "str": str,
+    "bool": lambda text: text == "True",
+    "int": int,
+    "float": float,
+    "nat": lambda text: pd.NaT,
+    "timestamp": pd.Timestamp,
+    "datetime": lambda text: pd.Timestamp(text).to_pydatetime(),
+    "date": lambda text: datetime.date(*(int(part) for part in text.split("-"))),
+    "time": _parse_time,
+}
+
+
+def _encode_value(value: Any) -> Tuple[str, Optional[str]]:
+    """
+    Returns the type and text of a value - the order of the checks matters, as bool is an int and NaT, Timestamp and
+    datetime are all dates
+    """
+    if value is None:
+        return "none", None
+    elif isinstance(value, str):
+        return "str", value
+    elif isinstance(value, (bool, np.bool_)):
+        return "bool", str(bool(value))
+    elif isinstance(value, (int, np.integer)):
+        return "int", str(int(value))
+    elif isinstance(value, (float, np.floating)):
+        return "float", repr(float(value))
+    elif value is pd.NaT:
+        return "nat", ""
+    elif isinstance(value, pd.Timestamp):
+        return "timestamp", value.isoformat()
+    elif isinstance(value, datetime.datetime):
+        return "datetime", value.isoformat()
+    elif isinstance(value, datetime.date):
+        return "date", value.isoformat()
+    elif isinstance(value, datetime.time) and value.tzinfo is None:
+        return "time", value.isoformat()
+    raise TypeError(f"Values of type {type(value).__name__} cannot be stored")
+
+
+def _decode_value(value_type: str, text: Optional[str]) -> Any:
+    return None if value_type == "none" else _VALUE_PARSERS[value_type](text)
+
+
+def _encode_values(values: np.ndarray) -> Tuple[List[Optional[str]], np.ndarray]:
+    encoded = [_encode_value(v) for v in values]
+    codes = np.array([_VALUE_TYPE_CODES[value_type] for value_type, _ in encoded], dtype=np.int8)
+    return [text for _, text in encoded], codes
+
+
+def _decode_values(texts: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    values = np.empty(len(codes), dtype=object)
+    for code in np.unique(codes):
+        positions = np.flatnonzero(codes == code)
+        value_type = _VALUE_TYPES[code]
+        if value_type == "str":
+            values[positions] = texts[positions]
+        else:
+            values[positions] = [_decode_value(value_type, text) for text in texts[positions]]
+    return values
+
+
+def frame_to_table(df: pd.DataFrame):
+    """
+    Converts df to an Arrow table that :func:`table_to_frame` converts back to the same frame, without pickling.
+
+    Columns keep their pandas types in the table metadata. Object columns that Arrow cannot store without changing
+    the values - mixed types, or numbers that would all become floats - are stored as a text column together with a
+    column holding the type of each value. Column labels are stored as JSON, with the same types as the values.
+    """
+    pa, feather = _import_pyarrow()
+    names = [str(ix) for ix in range(df.shape[1])]
+    data = {}
+    encoded = []
+    for ix in range(df.shape[1]):
+        series = df.iloc[:, ix]
+        if series.dtype == object:
+            try:
+                array_type = pa.Array.from_pandas(series).type
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                array_type = None
+            # Arrow would coerce mixed numbers, so only text and boolean object columns are stored natively
+            if array_type is None or not (pa.types.is_string(array_type) or pa.types.is_boolean(array_type)):
+                texts, codes = _encode_values(series.to_numpy())
+                data[names[ix]] = pd.Series(texts, index=series.index, dtype=object)
+                data[f"{names[ix]}:type"] = pd.Series(codes, index=series.index)
+                encoded.append(ix)
+                continue
+        data[names[ix]] = series
+
+    table = pa.Table.from_pandas(pd.DataFrame(data, index=df.index, copy=False), preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[b'fddc.columns'] = json.dumps([_encode_value(label) for label in df.columns]).encode('utf-8')
+    metadata[b'fddc.encoded'] = json.dumps(encoded).encode('utf-8')
+    return table.replace_schema_metadata(metadata)
+
+
+def table_to_frame(table) -> pd.DataFrame:
+    """
+    Converts a table written by :func:`frame_to_table` back to a frame
+    """
+    metadata = table.schema.metadata
+    columns = [_decode_value(value_type, text) for value_type, text in json.loads(metadata[b'fddc.columns'])]
+    encoded = set(json.loads(metadata[b'fddc.encoded'].decode('utf-8')))
+    stored = table.to_pandas()
+
+    data = {}
+    for ix in range(len(columns)):
+        name = str(ix)
+        if ix in encoded:
+            data[ix] = _decode_values(stored[name].to_numpy(dtype=object), stored[f"{name}:type"].to_numpy())
+        else:
+            series = stored[name]
+            if series.dtype == object:
+                # Missing values in text columns are read by pandas as NaN rather than None
+                series = series.where(series.notnull(), np.nan)
+            data[ix] = series
+
+    df = pd.DataFrame(data, index=stored.index)
+    df.columns = columns
+    return df
+
+
+def write_frame(df: pd.DataFrame, path: str, compression: str = None):
+    """
+    Writes df to a Feather file with :func:`frame_to_table`. The file is written to a temporary file in the same
+    directory first so that readers never see a partial file.
+
+    :param compression: 'lz4', 'zstd' or None to write an uncompressed file that can be memory-mapped
+    """
+    pa, feather = _import_pyarrow()
+    table = frame_to_table(df)
+    handle, temporary = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    os.close(handle)
+    try:
+        feather.write_feather(table, temporary, compression=compression or 'uncompressed')
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+
+def read_frame(path: str, memory_map: bool = False) -> pd.DataFrame:
+    """
+    Reads a frame written by :func:`write_frame`
+    """
+    pa, feather = _import_pyarrow()
+    return table_to_frame(feather.read_table(path, memory_map=memory_map))
+
+
+class DataFrameCache:
+    """
+    An on-disk cache of parsed sheets, stored as uncompressed Feather (Arrow IPC) files so they can be read back
+    memory-mapped rather than parsing the Excel file again.
+
+    Entries are keyed on the file path, modification time and size and on the sheet name and header row, so a
+    changed file is parsed again. Frames are stored with :func:`frame_to_table`, so columns of mixed types, which
+    Arrow cannot store, are kept as text with the type of each value.
+
+    Requires pyarrow.
+    """
+
+    FORMAT_VERSION = 2
+
+    def __init__(self, directory: str, memory_map: bool = True):
+        _import_pyarrow()
+        self.directory = directory
+        self.memory_map = memory_map
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, filename: str, sheetname: str, header_row_index: int, **options: Any) -> str:
+        """
+        Returns the cache key for a sheet read from the current version of filename. Any options that change how
+        the sheet is read must be included.
+        """
+        serialised = json.dumps([self.FORMAT_VERSION, file_key(filename), sheetname, header_row_index, options],
+                                sort_keys=True, default=str)
+        return hashlib.sha256(serialised.encode('utf-8')).hexdigest()
+
+    def __path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.feather")
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """
+        Returns the cached frame for key, or None if there is none
+        """
+        path = self.__path(key)
+        if not os.path.exists(path):
+            return None
+        logger.debug(f"Reading {key} from sheet cache.")
+        return read_frame(path, memory_map=self.memory_map)
+
+    def put(self, key: str, df: pd.DataFrame) -> bool:
+        """
+        Stores df under key, returning False if it could not be stored
+        """
+        try:
+            write_frame(df, self.__path(key))
+        except Exception as e:
+            logger.warning(f"Unable to cache sheet: {e}")
+            return False
+        return True
+
+    def clear(self):
+        """
+        Removes all cached frames
+        """
+        for path in glob.glob(os.path.join(self.directory, "*.feather")):
+            os.remove(path)
@@ -0,0 +1,138 @@
+import logging
+from dataclasses import dataclass
+from typing import Iterable, Sequence, Tuple, Union
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger('fddc.datatables.dedupe')
+
+
+@dataclass(frozen=True)
+class DeduplicationStats:
+    rows_before: int
+    rows_after: int
+    dropped: pd.DataFrame
+    """ The key columns and number of 'dropped' rows for each key that had duplicates """
+
+    @property
+    def rows_dropped(self) -> int:
+        return self.rows_before - self.rows_after
+
+
+def row_keys(df: pd.DataFrame, subset: Sequence[str]) -> Tuple[np.ndarray, int]:
+    """
+    Returns an integer key per row that is equal for rows with equal values in subset, and the number of keys.
+
+    Values are compared as :meth:`pandas.DataFrame.drop_duplicates` compares them - missing values are equal to each
+    other - but without sorting the frame.
+    """
+    keys = np.zeros(df.shape[0], dtype=np.int64)
+    key_count = 1
+    for column in subset:
+        codes, uniques = pd.factorize(df[column])
+        codes = np.where(codes < 0, len(uniques), codes)
+        keys, key_uniques = pd.factorize(keys * (len(uniques) + 1) + codes)
+        key_count = len(key_uniques)
+    return keys, key_count
+
+
+def _sort_rank(df: pd.DataFrame, columns: Sequence[str]) -> np.ndarray:
+    """
+    Returns the rank of each row when ordered by columns - missing values sort last. Only the distinct
+    combinations of values are sorted, not the rows.
+    """
+    keys, key_count = row_keys(df, columns)
+    first_row = np.zeros(key_count, dtype=np.int64)
+    first_row[keys[::-1]] = np.arange(df.shape[0] - 1, -1, -1)
+
+    distinct = df.iloc[first_row][list(columns)].reset_index(drop=True)
+    order = distinct.sort_values(list(columns), kind='mergesort', na_position='last').index.to_numpy()
+    rank = np.zeros(key_count, dtype=np.int64)
+    rank[order] = np.arange(key_count)
+    return rank[keys]
+
+
+def _select(keys: np.ndarray, score: np.ndarray, key_count: int) -> np.ndarray:
+    """
+    Returns the row positions with the highest score per key, in row order. Scores must be unique.
+    """
+    best = np.full(key_count, np.iinfo(np.int64).min, dtype=np.int64)
+    np.maximum.at(best, keys, score)
+    return np.flatnonzero(score == best[keys])
+
+
+def _stats(df: pd.DataFrame, subset: Sequence[str], keys: np.ndarray, selected: np.ndarray) -> DeduplicationStats:
+    sizes = np.bincount(keys)
+    duplicated = selected[sizes[keys[selected]] > 1]
+    dropped = df.iloc[duplicated][list(subset)].copy()
+    dropped['dropped'] = sizes[keys[duplicated]] - 1
+    return DeduplicationStats(rows_before=df.shape[0], rows_after=len(selected), dropped=dropped.reset_index(drop=True))
+
+
+def deduplicate(
+        df: pd.DataFrame,
+        subset: Iterable[str],
+        keep: str = 'most_complete',
+        sort_key: Union[str, Iterable[str], None] = None,
+        coalesce: bool = False,
+) -> Tuple[pd.DataFrame, DeduplicationStats]:
+    """
+    Keeps a single row for each distinct combination of values in subset, without sorting the frame.
+
+    :param df: the frame to deduplicate
+    :param subset: the key columns
+    :param keep: 'most_complete' to keep the row with the most non-null values (the first such row on ties), or
+                 'latest' to keep the row with the highest sort_key (the last such row on ties)
+    :param sort_key: the column(s) to order rows by for keep='latest' - if None the last row is kept
+    :param coalesce: only for keep='latest' - rather than keeping whole rows, take the latest non-null value of each
+                     column, as :meth:`pandas.core.groupby.GroupBy.last` does after sorting by sort_key
+    :return: the deduplicated frame in original row order, and statistics on the rows dropped per key
+    """
+    subset = list(subset)
+    row_count = df.shape[0]
+    keys, key_count = row_keys(df, subset)
+    positions = np.arange(row_count, dtype=np.int64)
+
+    # Scores are made unique by including the row position, so the maximum identifies a single row
+    if keep == 'most_complete':
+        score = df.notnull().sum(axis=1).to_numpy(dtype=np.int64) * row_count + (row_count - 1 - positions)
+    elif keep == 'latest':
+        if sort_key is None:
+            score = positions
+        else:
+            sort_columns = [sort_key] if isinstance(sort_key, str) else list(sort_key)
+            score = _sort_rank(df, sort_columns) * row_count + positions
+    else:
+        raise ValueError(f"Unknown value for keep: {keep}")
+
+    selected = _select(keys, score, key_count)
+    stats = _stats(df, subset, keys, selected)
+
+    if coalesce:
+        if keep != 'latest':
+            raise ValueError("Coalescing is only supported when keeping the latest rows")
+        result = df.iloc[selected].reset_index(drop=True)
+        # The output row of each key
+        output_row = np.zeros(key_count, dtype=np.int64)
+        output_row[keys[selected]] = np.arange(len(selected))
+        for ix, column in enumerate(df.columns):
+            if column in subset:
+                continue
+            values = df.iloc[:, ix]
+            not_null = values.notnull().to_numpy()
+            if not_null.all():
+                # The selected row already holds the latest value
+                continue
+            rows = positions[not_null][_select(keys[not_null], score[not_null], key_count)]
+            # Keys without any non-null value are left missing
+            take_rows = np.full(len(selected), -1, dtype=np.int64)
+            take_rows[output_row[keys[rows]]] = rows
+            result[column] = pd.api.extensions.take(values.array, take_rows, allow_fill=True)
+    else:
+        result = df.iloc[selected]
+
+    logger.debug(f"Deduplicated {stats.rows_before} rows to {stats.rows_after} rows "
+                 f"on {len(subset)} key columns ({key_count} keys)")
+
+    return result, stats
+
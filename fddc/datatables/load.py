@@ -1,20 +1,50 @@
 import logging
+from typing import Any, Dict, List
 import pandas as pd
 from fddc.annex_a.merger.workbook_util import WorkSheetDetail
-from fddc.datatables.cache import ExcelFileSource
+from fddc.datatables.cache import DataFrameCache, ExcelFileSource
 
 logger = logging.getLogger('fddc.datatables.load')
 
 
 def load_dataframe(
         source: WorkSheetDetail,
-        file_source: ExcelFileSource = ExcelFileSource(),
+        file_source: ExcelFileSource = None,
+        dataframe_cache: DataFrameCache = None,
+        usecols: List[int] = None,
+        dtype: Dict[Any, Any] = None,
 ) -> pd.DataFrame:
+    """
+    Reads the sheet described by source, starting at its header row.
+
+    :param source: the sheet to read
+    :param file_source: a source of open workbooks to share between calls - if None the workbook is opened and closed
+    :param dataframe_cache: an optional cache of previously parsed sheets - sheets not found are parsed and added
+    :param usecols: the positions of the columns to read - if None all columns are read
+    :param dtype: the types to read columns as, keyed on their header, as for :func:`pandas.read_excel`
+    :return: the sheet contents
+    """
 
     logger.info(f"Reading '{source.sheetname}' from '{source.filename}' starting on row {source.header_row_index}")
 
-    file = file_source.get_file(source.filename)
-    df = pd.read_excel(file, skiprows=source.header_row_index - 1, sheet_name=source.sheetname)
+    if dataframe_cache is not None:
+        key = dataframe_cache.key(source.filename, source.sheetname, source.header_row_index,
+                                  usecols=usecols, dtype=sorted((str(k), str(v)) for k, v in (dtype or {}).items()))
+        df = dataframe_cache.get(key)
+        if df is None:
+            df = load_dataframe(source, file_source, usecols=usecols, dtype=dtype)
+            dataframe_cache.put(key, df)
+        else:
+            logger.debug(f"Read {df.shape[0]} rows and {df.shape[1]} cols from cache")
+        return df
+
+    if file_source is None:
+        with ExcelFileSource(max_files=1) as file_source:
+            return load_dataframe(source, file_source, usecols=usecols, dtype=dtype)
+
+    with file_source.open_file(source.filename) as file:
+        df = pd.read_excel(file, skiprows=source.header_row_index - 1, sheet_name=source.sheetname,
+                           usecols=usecols, dtype=dtype)
 
     logger.debug(f"Read {df.shape[0]} rows and {df.shape[1]} cols from '{source.sheetname}' in '{source.filename}'")
 
@@ -1,18 +1,125 @@
 import logging
-from typing import Iterable, Union, Sequence
+from typing import Iterable, List, Union, Sequence
 import pandas as pd
 import numpy as np
 
 from fddc.annex_a.merger.configuration import ColumnConfig
+from fddc.datatables import dedupe
 
 logger = logging.getLogger('fddc.datatables.merge')
 
 
+def _memory_mb(dataframes: Sequence[pd.DataFrame]) -> float:
+    return sum(df.memory_usage(index=True, deep=True).sum() for df in dataframes) / 2 ** 20
+
+
+def categorise_repeated(
+        dataframes: Sequence[pd.DataFrame],
+        exclude: Iterable[str] = (),
+        max_unique_ratio: float = 0.5
+) -> List[str]:
+    """
+    Converts text columns with repeated values to categoricals, in place. Each column is given the same categories in
+    every frame, so they remain categoricals when concatenated. Only columns holding nothing but strings are converted
+    - categories compare values by equality, so 1, 1.0 and True would otherwise become the same value.
+
+    :param dataframes: the frames to convert
+    :param exclude: columns to leave unchanged
+    :param max_unique_ratio: only convert columns with at most this many distinct values per row
+    :return: the converted columns
+    """
+    exclude = set(exclude)
+    row_count = sum(df.shape[0] for df in dataframes)
+    columns = []
+    for df in dataframes:
+        columns += [c for c in df.columns if df[c].dtype == object and c not in exclude and c not in columns]
+
+    converted = []
+    for column in columns:
+        present = [df for df in dataframes if column in df.columns]
+        if any(pd.api.types.infer_dtype(df[column], skipna=True) not in ("string", "empty") for df in present):
+            continue
+        categories = pd.unique(np.concatenate([df[column].dropna().unique() for df in present]))
+        if row_count == 0 or len(categories) > max_unique_ratio * row_count:
+            continue
+        try:
+            dtype = pd.CategoricalDtype(categories)
+        except (TypeError, ValueError):
+            # e.g. values that cannot be hashed into an index
+            continue
+        for df in present:
+            df[column] = df[column].astype(dtype)
+        converted.append(column)
+    return converted
+
+
+def _key_order(df: pd.DataFrame, columns: Sequence[str]) -> np.ndarray:
+    """
+    Returns the row positions of df sorted by the values in columns, as groupby sorts the keys of an object column
+    """
+    return np.lexsort([_sorted_codes(df[column]) for column in reversed(columns)])
+
+
+def _sorted_codes(values: pd.Series) -> np.ndarray:
+    # Categories are in order of first appearance, so the codes of a categorical are mapped to the rank of their
+    # category rather than sorting by category order
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        category_rank = pd.factorize(values.cat.categories, sort=True)[0]
+        codes = values.cat.codes.to_numpy()
+        return np.where(codes >= 0, category_rank[codes], -1)
+    return pd.factorize(values, sort=True)[0]
+
+
+def union_categories(dataframes: Sequence[pd.DataFrame]) -> List[str]:
+    """
+    Gives each column that is categorical in all the frames the same categories in every frame, in place, so that it
+    remains categorical when concatenated rather than becoming an object column.
+
+    :param dataframes: the frames to convert
+    :return: the columns that were changed
+    """
+    dtypes = {}
+    for df in dataframes:
+        for column in df.columns:
+            dtypes.setdefault(column, []).append(df[column].dtype)
+
+    changed = []
+    for column, column_dtypes in dtypes.items():
+        if len(column_dtypes) < 2 or not all(isinstance(d, pd.CategoricalDtype) for d in column_dtypes):
+            continue
+        if all(d == column_dtypes[0] for d in column_dtypes):
+            continue
+        dtype = pd.CategoricalDtype(pd.unique(np.concatenate([np.asarray(d.categories) for d in column_dtypes])))
+        for df in dataframes:
+            if column in df.columns and df[column].dtype != dtype:
+                df[column] = df[column].astype(dtype)
+        changed.append(column)
+    return changed
+
+
 def merge_dataframes(
         dataframes: Sequence[pd.DataFrame],
         columns: Iterable[ColumnConfig],
-        sort_key: Union[str, Iterable[str]] = None
+        sort_key: Union[str, Iterable[str]] = None,
+        coalesce: bool = True,
+        categorise: bool = False
 ) -> pd.DataFrame:
+    """
+    Concatenates the frames and keeps a single row for each combination of values in the unique columns.
+
+    :param dataframes: the frames to merge
+    :param columns: the column configuration - columns flagged as unique identify a row
+    :param sort_key: the column(s) identifying the most recent rows
+    :param coalesce: if True each column takes the most recent non-null value for the key, as
+                     :meth:`pandas.core.groupby.GroupBy.last` does - if False the most recent row is kept as it is
+    :param categorise: convert repeated text columns to categoricals while merging to reduce peak memory use. This
+                       modifies the input frames. The merged frame has the original column types.
+    :return: the merged frame, sorted by the unique columns
+
+    Columns that are already categorical keep their type - their categories are extended in the input frames where
+    they differ, see :func:`union_categories`.
+    """
+    columns = list(columns)
     all_column_names = [c.name for c in columns]
     unique_columns = [c.name for c in columns if c.unique]
 
@@ -20,23 +127,49 @@ def merge_dataframes(
                  f"unique columns: {unique_columns}")
 
     df_lengths = [df.shape[0] for df in dataframes]
+    # Measuring the memory of object columns means visiting every value, so only do it when debugging
+    report_memory = logger.isEnabledFor(logging.DEBUG)
+    if report_memory:
+        memory_before = _memory_mb(dataframes)
+
+    union_categories(dataframes)
+
+    categorical_columns = []
+    if categorise:
+        sort_columns = [] if sort_key is None else [sort_key] if isinstance(sort_key, str) else list(sort_key)
+        categorical_columns = categorise_repeated(dataframes, exclude=sort_columns)
+        logger.debug(f"Converted {len(categorical_columns)} columns to categoricals")
 
     df = pd.concat(dataframes)
     len_before = df.shape[0]
 
-    if sort_key is not None:
-        df.sort_values(sort_key, ascending=True, inplace=True)
-
     if len(unique_columns) > 0:
-        df = df.groupby(unique_columns).last().reset_index()
-        df = df[all_column_names]
+        # Rows without a complete key are discarded, as groupby does, then we take the latest row (or latest
+        # non-null value of each column) for each key
+        complete_keys = df[unique_columns].notnull().all(axis=1).to_numpy()
+        if not complete_keys.all():
+            df = df[complete_keys]
+        df, stats = dedupe.deduplicate(df, unique_columns, keep='latest', sort_key=sort_key, coalesce=coalesce)
+
+        # Rows are returned sorted by key, as a groupby on the unique columns returns them
+        df = df.iloc[_key_order(df, unique_columns)][all_column_names].reset_index(drop=True)
         len_after = df.shape[0]
 
         logger.info(f"Deduplicated {len_before} rows resulting in {len_after} unique rows.")
+        logger.debug(f"{stats.dropped.shape[0]} keys had duplicate rows")
 
         # If we have ended up with less rows than our smallest sheet, then something odd is going on
         if len_after < np.min(df_lengths):
             logger.warning(f"Low number of rows after deduplication - could indicate a problem. "
                            f"Before: {len_before} After: {len_after}")
+    elif sort_key is not None:
+        df = df.sort_values(sort_key, kind='mergesort')
+
+    restore = {c: object for c in categorical_columns if c in df.columns}
+    if len(restore) > 0:
+        df = df.astype(restore)
+
+    if report_memory:
+        logger.debug(f"Merged {len(dataframes)} dataframes using {memory_before:.1f}MB into {_memory_mb([df]):.1f}MB")
 
     return df
@@ -1,5 +1,6 @@
 import logging
-from typing import Iterable, Mapping
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
 import pandas as pd
 import numpy as np
 
@@ -12,7 +13,8 @@ def normalise_dataframe(
         df: pd.DataFrame,
         column_names: Iterable[str],
         column_map: Mapping[str, str] = None,
-        only_retain_mapped: bool = True
+        only_retain_mapped: bool = True,
+        copy: bool = True
 ) -> pd.DataFrame:
     """
     Renames columns and adds any missing (unmatched) columns
@@ -23,59 +25,363 @@ def normalise_dataframe(
     :param only_retain_mapped: by default only columns that are in the map are retained, but if may columns already
     match and you only want to map a few, then set this to False to keep any that already have the right name. If you
     don't provide a map, then this setting has no effect.
+    :param copy: set this to False to build the result from the column data of df without copying it - the result
+    must then be treated as read-only, as writing to its values would also change df
     :return: the resulting DataFrame
     """
     if df is None:
         df = pd.DataFrame(columns=column_names)
 
+    column_names = list(column_names)
+
+    # Find the source column for each output column
+    sources = {}
     if column_map is not None:
-        if only_retain_mapped:
-            df = df[column_map.keys()].copy()
-        df.rename(columns=column_map, inplace=True)
+        for label, name in column_map.items():
+            sources.setdefault(name, label)
+    if column_map is None or not only_retain_mapped:
+        for label in df.columns:
+            if label in column_names and (column_map is None or label not in column_map):
+                sources.setdefault(label, label)
 
-    # Add missing columns
-    missing_columns = set(column_names) - set(df.columns)
+    # Missing columns all share a single block of NaN
+    missing_columns = [c for c in column_names if c not in sources]
     for c in missing_columns:
         logger.debug("Adding missing column {}".format(c))
-        df[c] = np.nan
+    missing = np.full((len(missing_columns), df.shape[0]), np.nan)
+    missing_ix = {c: ix for ix, c in enumerate(missing_columns)}
+
+    # The frame is built from the existing column arrays without copying them. Leaving it unconsolidated means the
+    # arrays are not copied into blocks either, and the dict is already in column order - passing columns as well
+    # would reindex it, which copies.
+    data = {c: df[sources[c]] if c in sources else missing[missing_ix[c]] for c in column_names}
+    result = pd.DataFrame(data, index=df.index, copy=False)
+    return result.copy() if copy else result
+
+
+class TypeCleaningReport:
+    """
+    Collects the values that could not be converted to their column type by :func:`clean_datatypes` and the memory
+    used by each column before and after conversion. Also remembers the date format found in each column of a source
+    so that later sheets from the same source start with it.
+    """
+
+    def __init__(self, date_formats: Dict[Tuple[str, str], str] = None):
+        self.date_formats: Dict[Tuple[str, str], str] = {} if date_formats is None else date_formats
+        self.__rejected: List[pd.DataFrame] = []
+        self.__memory: List[Tuple[str, str, str, int, int]] = []
+
+    def add_rejected(self, source: str, column: str, column_type: str, values: Sequence, counts: Sequence[int]):
+        if len(values) > 0:
+            self.__rejected.append(pd.DataFrame({"source": source, "column": column, "type": column_type,
+                                                 "value": list(values), "count": counts}))
+
+    def add_memory(self, source: str, column: str, column_type: str, bytes_before: int, bytes_after: int):
+        self.__memory.append((source, column, column_type, bytes_before, bytes_after))
+
+    def extend(self, other: "TypeCleaningReport"):
+        self.date_formats.update(other.date_formats)
+        self.__rejected += other.__rejected
+        self.__memory += other.__memory
+
+    def rejected(self) -> pd.DataFrame:
+        """
+        Returns a table of the distinct values that were removed, with the number of times each was found
+        """
+        if len(self.__rejected) == 0:
+            return pd.DataFrame(columns=["source", "column", "type", "value", "count"])
+        return pd.concat(self.__rejected, ignore_index=True)
+
+    def memory(self) -> pd.DataFrame:
+        """
+        Returns the memory in bytes used by each converted column before and after conversion, and the bytes saved
+        """
+        df = pd.DataFrame(self.__memory, columns=["source", "column", "type", "bytes_before", "bytes_after"])
+        df["bytes_saved"] = df["bytes_before"] - df["bytes_after"]
+        return df
+
+
+# Fixed formats tried on text dates - all day first, and only four digit years as two digit years are expanded
+# differently by the fixed format and general parsers
+DATE_FORMATS = (
+    "%d/%m/%Y",
+    "%Y-%m-%d",
+    "%d-%m-%Y",
+    "%d.%m.%Y",
+    "%d/%m/%Y %H:%M:%S",
+    "%d/%m/%Y %H:%M",
+    "%Y-%m-%d %H:%M:%S",
+    "%d %b %Y",
+    "%d %B %Y",
+)
+DATE_FORMAT_SAMPLE = 100
+
+COLUMN_TYPES = ("date", "category", "int", "string", "bool")
+
+
+def _parse_format(values: np.ndarray, date_format: str) -> pd.Series:
+    return pd.to_datetime(pd.Series(values, dtype=object), format=date_format, errors="coerce")
+
+
+def infer_date_format(values: np.ndarray, preferred: str = None) -> Optional[str]:
+    """
+    Returns the format in DATE_FORMATS that parses most of a sample of the text values, or None if none of them
+    parse any. The preferred format is used without trying the others if it parses the whole sample.
+    """
+    sample = values[:DATE_FORMAT_SAMPLE]
+    if len(sample) == 0:
+        return None
+    if preferred is not None and _parse_format(sample, preferred).notnull().all():
+        return preferred
+
+    best_format, best_count = None, 0
+    for date_format in DATE_FORMATS:
+        count = _parse_format(sample, date_format).notnull().sum()
+        if count > best_count:
+            best_format, best_count = date_format, count
+            if count == len(sample):
+                break
+    return best_format
+
+
+def _parse_dates(values: np.ndarray, date_format: Optional[str]) -> pd.Series:
+    """
+    Parses distinct values as pd.to_datetime(dayfirst=True) would, using the fixed date_format for the text values
+    it matches, which is much faster than the general parser
+    """
+    matched = np.array([], dtype=int)
+    if date_format is not None:
+        text = np.flatnonzero([isinstance(v, str) for v in values])
+        text_parsed = _parse_format(values[text], date_format)
+        matched = text[text_parsed.notnull().to_numpy()]
+        text_parsed = text_parsed.dropna()
+
+    if len(matched) == 0:
+        return pd.to_datetime(pd.Series(values, dtype=object), dayfirst=True, errors="coerce")
+
+    parsed = pd.Series(pd.NaT, index=range(len(values)), dtype="datetime64[ns]")
+    parsed.iloc[matched] = text_parsed.to_numpy()
+
+    # Anything else goes to the general parser - numbers are parsed differently depending on what else is in the
+    # column, so all the values that are not text must be parsed together
+    remaining = np.ones(len(values), dtype=bool)
+    remaining[matched] = False
+    if remaining.any():
+        generic = pd.to_datetime(pd.Series(values[remaining], dtype=object), dayfirst=True, errors="coerce")
+        parsed.iloc[np.flatnonzero(remaining)] = generic.to_numpy()
+    return parsed
+
+
+def _clean_date_column(
+        df: pd.DataFrame,
+        col_name: str,
+        report: TypeCleaningReport = None,
+        source: str = None
+) -> pd.DataFrame:
+    # Dates repeat heavily, so only the distinct values are parsed and then mapped back to the rows
+    codes, uniques = pd.factorize(df[col_name])
+    uniques = np.asarray(uniques, dtype=object)
+
+    if df[col_name].dtype.kind == "M":
+        parsed = pd.Series(uniques, dtype="datetime64[ns]")
+    else:
+        text = np.array([v for v in uniques if isinstance(v, str)], dtype=object)
+        key = (source, col_name)
+        preferred = None if report is None else report.date_formats.get(key)
+        date_format = infer_date_format(text, preferred)
+        if report is not None and date_format is not None:
+            report.date_formats[key] = date_format
+        parsed = _parse_dates(uniques, date_format)
+
+    # Missing values are coded as -1, which picks the NaT on the end
+    dates = np.append(parsed.dt.date.to_numpy(dtype=object), pd.NaT)
+    df[col_name] = dates[codes]
+
+    rejected = parsed.isnull().to_numpy()
+    if rejected.any():
+        counts = _report_rejected(codes, uniques, rejected, col_name, "date", report, source)
+        logger.warning(f"Removed {counts.sum()} dates due to invalid format.")
+
+    return df
+
+
+def _report_rejected(
+        codes: np.ndarray,
+        uniques: np.ndarray,
+        rejected: np.ndarray,
+        col_name: str,
+        col_type: str,
+        report: Optional[TypeCleaningReport],
+        source: Optional[str]
+) -> np.ndarray:
+    """
+    Adds the rejected distinct values to the report and returns the number of rows with each of them
+    """
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))[rejected]
+    if report is not None:
+        report.add_rejected(source, col_name, col_type, uniques[rejected], counts)
+    return counts
+
+
+def _pandas_version() -> Tuple[int, int]:
+    major, minor = pd.__version__.split(".")[:2]
+    return int(major), int(minor)
+
+
+def _string_dtype() -> pd.StringDtype:
+    # Arrow-backed strings take a fraction of the memory of Python strings, but need pyarrow and pandas 1.3
+    if _pandas_version() < (1, 3):
+        return pd.StringDtype()
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return pd.StringDtype("python")
+    return pd.StringDtype("pyarrow")
+
+
+def _to_string(value) -> str:
+    # Numeric identifiers are often read as floats because of missing values
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        return str(int(value))
+    return str(value)
+
+
+TRUE_VALUES = {"true", "t", "yes", "y", "1"}
+FALSE_VALUES = {"false", "f", "no", "n", "0"}
+
+
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def _to_int(value) -> Optional[int]:
+    # Integers and text are converted exactly - only float values go through float, so large identifiers keep
+    # all their digits
+    if isinstance(value, (bool, np.bool_)):
+        number = int(value)
+    elif isinstance(value, (int, np.integer)):
+        number = int(value)
+    elif isinstance(value, (float, np.floating)):
+        if not np.isfinite(value) or not float(value).is_integer():
+            return None
+        number = int(value)
+    elif isinstance(value, str):
+        try:
+            decimal = Decimal(value.strip())
+        except InvalidOperation:
+            return None
+        if not decimal.is_finite() or decimal != decimal.to_integral_value():
+            return None
+        number = int(decimal)
+    else:
+        return None
+    return number if INT64_MIN <= number <= INT64_MAX else None
+
+
+def _to_bool(value) -> Optional[bool]:
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return {1: True, 0: False}.get(value)
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if value in TRUE_VALUES:
+            return True
+        elif value in FALSE_VALUES:
+            return False
+    return None
 
-    # Return columns in right order
-    return df[column_names].copy()
 
+def _convert_int(uniques: np.ndarray) -> Tuple[pd.api.extensions.ExtensionArray, np.ndarray]:
+    values = [_to_int(v) for v in uniques]
+    return pd.array(values, dtype="Int64"), np.array([v is not None for v in values], dtype=bool)
 
-def _clean_date_column(df: pd.DataFrame, col_name: str) -> pd.DataFrame:
-    size_before = df[col_name].count()
-    after_col = col_name + "_after_convert"
 
-    df[after_col] = pd.to_datetime(df[col_name], dayfirst=True, errors="coerce")
+def _convert_string(uniques: np.ndarray) -> Tuple[pd.api.extensions.ExtensionArray, np.ndarray]:
+    return pd.array([_to_string(v) for v in uniques], dtype=_string_dtype()), np.ones(len(uniques), dtype=bool)
 
-    # error_values = df[~df[col_name].isnull() & df[after_col].isnull()][col_name].values.tolist()
-    # error_values = [{"sourcename": sheet.source_config.name,
-    #                  "sheetname": sheet.sheet_detail.sheetname,
-    #                  "column": col_name,
-    #                  "column_type": 'date',
-    #                  "original": v
-    #                  } for v in error_values]
 
-    df[col_name] = df[after_col]
-    df[col_name] = df[col_name].dt.date
+def _convert_bool(uniques: np.ndarray) -> Tuple[pd.api.extensions.ExtensionArray, np.ndarray]:
+    values = [_to_bool(v) for v in uniques]
+    return pd.array(values, dtype="boolean"), np.array([v is not None for v in values], dtype=bool)
 
-    size_after = df[col_name].count()
 
-    if size_before != size_after:
-        logger.warning(f"Removed {size_before - size_after} dates due to invalid format.")
+_CONVERTERS = {
+    "int": _convert_int,
+    "string": _convert_string,
+    "bool": _convert_bool,
+}
 
-    del df[after_col]
+
+def _clean_typed_column(
+        df: pd.DataFrame,
+        col_name: str,
+        col_type: str,
+        report: TypeCleaningReport = None,
+        source: str = None
+) -> pd.DataFrame:
+    codes, uniques = pd.factorize(df[col_name])
+    uniques = np.asarray(uniques, dtype=object)
+
+    # As with dates, only the distinct values are converted and then mapped back to the rows
+    converted, valid = _CONVERTERS[col_type](uniques)
+    df[col_name] = pd.api.extensions.take(converted, codes, allow_fill=True)
+
+    rejected = ~valid
+    if rejected.any():
+        counts = _report_rejected(codes, uniques, rejected, col_name, col_type, report, source)
+        logger.warning(f"Removed {counts.sum()} values from {col_name} that are not a valid {col_type}.")
 
     return df
 
 
-def clean_datatypes(df: pd.DataFrame, spec: Iterable[ColumnConfig]) -> pd.DataFrame:
+def _clean_category_column(df: pd.DataFrame, col_name: str) -> pd.DataFrame:
+    # Categories compare values by equality, so 1, 1.0 and True would become the same value - only text is converted
+    values = df[col_name]
+    if values.dtype == object and pd.api.types.infer_dtype(values, skipna=True) not in ("string", "empty"):
+        logger.warning(f"Not converting {col_name} to a category as it holds values other than text.")
+        return df
+    df[col_name] = values.astype("category")
+    return df
+
+
+def clean_datatypes(
+        df: pd.DataFrame,
+        spec: Iterable[ColumnConfig],
+        report: TypeCleaningReport = None,
+        source: str = None
+) -> pd.DataFrame:
+    """
+    Converts the columns with a type in spec to that type. Values that cannot be converted are removed.
+
+    :param df:
+    :param spec:
+    :param report: optional report to collect the removed values in
+    :param source: the name of the source df was read from - used to label the removed values and to reuse the date
+                   formats found in earlier sheets from the same source
+    :return: the resulting DataFrame
+    """
     # See if we need special type handling on any columns
     for col in spec:
         col_type = col.type
         col_name = col.name
+        if col_type is None:
+            continue
+        if col_type not in COLUMN_TYPES:
+            logger.warning(f"Unknown type {col_type} for column {col_name}")
+            continue
+
+        if report is not None:
+            memory_before = df[col_name].memory_usage(index=False, deep=True)
+
         if col_type == "date":
-            df = _clean_date_column(df, col_name)
+            df = _clean_date_column(df, col_name, report=report, source=source)
+        elif col_type == "category":
+            df = _clean_category_column(df, col_name)
+        else:
+            df = _clean_typed_column(df, col_name, col_type, report=report, source=source)
+
+        if report is not None:
+            report.add_memory(source, col_name, col_type, memory_before,
+                              df[col_name].memory_usage(index=False, deep=True))
 
     return df
@@ -0,0 +1,206 @@
+import abc
+import datetime
+import logging
+import math
+import os
+from typing import Any, Callable, Dict
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+logger = logging.getLogger('fddc.datatables.write')
+
+
+class TableWriter(abc.ABC):
+    """
+    Writes a set of named tables - one per data source - to a single output.
+
+    Writers are created with :func:`create_writer` and can be used as a context manager to close them on exit.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @abc.abstractmethod
+    def write(self, name: str, df: pd.DataFrame):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ExcelTableWriter(TableWriter):
+    """
+    Writes each table to a sheet of an xlsx workbook using xlsxwriter directly. In constant memory mode each row is
+    flushed to disk as soon as it is written, so memory use does not grow with the size of the tables.
+
+    Text is always written as text - unlike pandas, strings that look like formulas or URLs are not converted.
+    """
+
+    MAX_ROWS = 1048576
+
+    def __init__(self, path: str, constant_memory: bool = True):
+        super().__init__(path)
+        self.workbook = xlsxwriter.Workbook(path, {'constant_memory': constant_memory})
+        self.header_format = self.workbook.add_format({'bold': True, 'border': 1, 'align': 'center',
+                                                       'valign': 'top'})
+        self.date_format = self.workbook.add_format({'num_format': 'YYYY-MM-DD'})
+        self.datetime_format = self.workbook.add_format({'num_format': 'YYYY-MM-DD HH:MM:SS'})
+
+    def write(self, name: str, df: pd.DataFrame):
+        if df.shape[0] + 1 > self.MAX_ROWS:
+            raise ValueError(f"{name} has {df.shape[0]} rows, which is more than an xlsx sheet can hold - "
+                             f"use another output format")
+
+        worksheet = self.workbook.add_worksheet(name)
+        worksheet.write_row(0, 0, [str(c) for c in df.columns], self.header_format)
+
+        columns = [df.iloc[:, ix].to_numpy(dtype=object) for ix in range(df.shape[1])]
+        for row_ix, row in enumerate(zip(*columns), start=1):
+            for col_ix, value in enumerate(row):
+                self.__write_cell(worksheet, row_ix, col_ix, value)
+
+    def __write_cell(self, worksheet, row_ix: int, col_ix: int, value: Any):
+        if value is None or value is pd.NaT or value is pd.NA:
+            return
+        if isinstance(value, str):
+            worksheet.write_string(row_ix, col_ix, value)
+        elif isinstance(value, (bool, np.bool_)):
+            worksheet.write_boolean(row_ix, col_ix, bool(value))
+        elif isinstance(value, (int, float, np.number)):
+            if math.isnan(value):
+                return
+            if math.isinf(value):
+                # As pandas writes infinite values
+                worksheet.write_string(row_ix, col_ix, 'inf' if value > 0 else '-inf')
+            else:
+                worksheet.write_number(row_ix, col_ix, value)
+        elif isinstance(value, datetime.datetime):
+            worksheet.write_datetime(row_ix, col_ix, value, self.datetime_format)
+        elif isinstance(value, datetime.date):
+            worksheet.write_datetime(row_ix, col_ix, value, self.date_format)
+        else:
+            worksheet.write(row_ix, col_ix, value)
+
+    def close(self):
+        self.workbook.close()
+
+
+class CsvTableWriter(TableWriter):
+    """
+    Writes each table to a CSV file named after it in the directory path, optionally gzip compressed.
+    """
+
+    def __init__(self, path: str, compression: str = None):
+        super().__init__(path)
+        self.compression = compression
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, name: str, df: pd.DataFrame):
+        extension = ".csv.gz" if self.compression == "gzip" else ".csv"
+        df.to_csv(os.path.join(self.path, name + extension), index=False, compression=self.compression)
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.feather
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Parquet and Feather output require pyarrow - install it with 'pip install pyarrow'") from e
+    return pyarrow
+
+
+def arrow_table(df: pd.DataFrame):
+    """
+    Converts df to an Arrow table, keeping the pandas types in its metadata. Object columns of mixed types, which
+    Arrow cannot store, are written as text.
+    """
+    pa = _import_pyarrow()
+    # A shallow copy, so the caller's frame keeps its labels and columns
+    df = df.copy(deep=False)
+    df.columns = [str(c) for c in df.columns]
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+
+    for ix in range(df.shape[1]):
+        series = df.iloc[:, ix]
+        try:
+            pa.Array.from_pandas(series)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            logger.warning(f"Column {df.columns[ix]} has values of mixed types - writing them as text")
+            df[df.columns[ix]] = series.map(str).where(series.notnull(), None)
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+class ParquetTableWriter(TableWriter):
+    """
+    Writes each table to a Parquet file named after it in the directory path. Requires pyarrow.
+    """
+
+    def __init__(self, path: str, compression: str = "snappy"):
+        _import_pyarrow()
+        super().__init__(path)
+        self.compression = compression
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, name: str, df: pd.DataFrame):
+        pa = _import_pyarrow()
+        pa.parquet.write_table(arrow_table(df), os.path.join(self.path, name + ".parquet"),
+                               compression=self.compression)
+
+
+class FeatherTableWriter(TableWriter):
+    """
+    Writes each table to a Feather (Arrow IPC) file named after it in the directory path. Requires pyarrow.
+    """
+
+    def __init__(self, path: str, compression: str = None):
+        _import_pyarrow()
+        super().__init__(path)
+        self.compression = compression
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, name: str, df: pd.DataFrame):
+        pa = _import_pyarrow()
+        pa.feather.write_feather(arrow_table(df), os.path.join(self.path, name + ".feather"),
+                                 compression=self.compression)
+
+
+WRITERS: Dict[str, Callable[..., TableWriter]] = {
+    "xlsx": ExcelTableWriter,
+    "csv": CsvTableWriter,
+    "csv.gz": lambda path, **options: CsvTableWriter(path, compression="gzip", **options),
+    "parquet": ParquetTableWriter,
+    "feather": FeatherTableWriter,
+}
+
+
+def register_writer(output_format: str, factory: Callable[..., TableWriter]):
+    """
+    Makes a writer available to :func:`create_writer`. factory is called with the output path and any options.
+    """
+    WRITERS[output_format] = factory
+
+
+def create_writer(path: str, output_format: str = "xlsx", **options) -> TableWriter:
+    """
+    Creates a writer for the output format.
+
+    :param path: the xlsx file, or the directory to write a file per table to for the other formats
+    :param output_format: one of 'xlsx', 'csv', 'csv.gz', 'parquet', 'feather' or a registered format
+    :param options: passed on to the writer
+    """
+    factory = WRITERS.get(output_format)
+    if factory is None:
+        raise ValueError(f"Unknown output format: {output_format}")
+    return factory(path, **options)
@@ -1,6 +1,10 @@
+import logging
 from lxml import etree
 import pandas as pd
 import re
+from fddc.datatables.dedupe import deduplicate
+
+logger = logging.getLogger('fddc.log.cin_log')
 
 # Function to pull all the files data into a unique dataframe
 # We recommend including all of the events into the cin log: it is the default list included below in build_cinrecord
@@ -24,10 +28,8 @@ def build_cinrecord(files, include_cincensus, tag_list=['CINreferralDate', 'CINc
         cinrecord = pd.concat(data_list, sort=False)
         
         # Remove duplicates of LAchildID, Date and Type - we keep the one with the least null values
-        cinrecord['null_values'] = cinrecord.isnull().sum(axis=1)
-        cinrecord = cinrecord.sort_values('null_values')
-        cinrecord.drop_duplicates(subset=['LAchildID', 'Date', 'Type'], keep='first', inplace=True)
-        cinrecord.drop(labels='null_values', axis=1, inplace=True)
+        cinrecord, stats = deduplicate(cinrecord, ['LAchildID', 'Date', 'Type'], keep='most_complete')
+        logger.info(f"Removed {stats.rows_dropped} duplicate events")
         
         return cinrecord
     
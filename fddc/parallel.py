@@ -0,0 +1,114 @@
+import logging
+import os
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, List, Union
+
+logger = logging.getLogger('fddc.parallel')
+
+
+def create_executor(parallel: Union[bool, str] = None, max_workers: int = None) -> Union[Executor, None]:
+    """
+    Creates an executor for the given parallel mode, or returns None when work should be done serially.
+
+    :param parallel: None or False to run serially, 'thread' for a thread pool, True or 'process' for a process pool
+    :param max_workers: maximum number of workers, defaults to the executor's own default
+    """
+    if parallel is None or parallel is False:
+        return None
+    elif parallel == 'thread':
+        return ThreadPoolExecutor(max_workers=max_workers)
+    elif parallel is True or parallel == 'process':
+        return ProcessPoolExecutor(max_workers=max_workers)
+    else:
+        raise ValueError(f"Unknown parallel mode: {parallel}")
+
+
+def map_ordered(
+        function: Callable,
+        items: Iterable[Any],
+        parallel: Union[bool, str] = None,
+        max_workers: int = None,
+        return_exceptions: bool = False
+) -> List[Any]:
+    """
+    Applies function to each item, optionally in a thread or process pool, and returns the results in the same order
+    as the items.
+
+    :param function: the function to apply - must be picklable (defined at module level) for process pools
+    :param items: the items to process
+    :param parallel: see :func:`create_executor`
+    :param max_workers: see :func:`create_executor`
+    :param return_exceptions: if True, an exception raised for an item is returned in its place rather than raised
+    :return: the results in item order
+    """
+    items = list(items)
+    executor = create_executor(parallel, max_workers)
+
+    if executor is None:
+        results = []
+        for item in items:
+            try:
+                results.append(function(item))
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results.append(e)
+        return results
+
+    with executor:
+        futures = [executor.submit(function, item) for item in items]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results.append(e)
+        return results
+
+
+def imap_ordered(
+        function: Callable,
+        items: Iterable[Any],
+        parallel: Union[bool, str] = None,
+        max_workers: int = None,
+        max_pending: int = None
+) -> Iterator[Any]:
+    """
+    Applies function to each item, optionally in a thread or process pool, yielding the results in the same order as
+    the items as soon as each is ready.
+
+    At most max_pending items are submitted ahead of the result being consumed, which bounds the number of results
+    held in memory while the consumer is busy. Exceptions are raised when the failed item's result is reached.
+
+    :param function: the function to apply - must be picklable (defined at module level) for process pools
+    :param items: the items to process - consumed lazily
+    :param parallel: see :func:`create_executor`
+    :param max_workers: see :func:`create_executor`
+    :param max_pending: maximum number of items in progress or waiting to be consumed, defaults to twice the
+                        number of workers
+    """
+    executor = create_executor(parallel, max_workers)
+
+    if executor is None:
+        for item in items:
+            yield function(item)
+        return
+
+    if max_pending is None:
+        max_pending = 2 * (max_workers or os.cpu_count() or 1)
+
+    with executor:
+        pending = deque()
+        try:
+            for item in items:
+                if len(pending) >= max_pending:
+                    yield pending.popleft().result()
+                pending.append(executor.submit(function, item))
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
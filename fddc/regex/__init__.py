@@ -1,8 +1,12 @@
 import re
-from typing import Pattern
+from functools import lru_cache
+from typing import Pattern, Tuple, Dict, Any, Iterable, List, Union
 
 __flag_resolved = dict(i=re.I, m=re.M, s=re.S, u=re.U, l=re.L, x=re.X)
 
+# Maximum number of distinct expressions held by each of the compiled-pattern caches
+CACHE_SIZE = 4096
+
 
 def resolve_flags(flags: str) -> int:
     flag_expr = 0
@@ -12,13 +16,24 @@ def resolve_flags(flags: str) -> int:
     return flag_expr
 
 
+@lru_cache(maxsize=None)
+def _delimited_expression(separator: str, parts: int) -> Pattern:
+    """
+    Returns the expression used to split '/{part}/.../{modifiers}' for a given separator character
+    """
+    separator = re.escape(separator)
+    parts = '{separator}(.+)'.format(separator=separator) * parts
+    return re.compile('{parts}({separator}([imsulx]+)?)'.format(parts=parts, separator=separator))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
 def parse_regex(regex: str) -> Pattern:
     """
     Parse a regex pattern '/{pattern}/{modifiers}'
+
+    Compiled patterns are cached - see :func:`cache_info` and :func:`cache_clear`.
     """
-    separator = re.escape(regex[0])
-    pattern = re.compile('{separator}(.+)({separator}([imsulx]+)?)'.format(separator=separator))
-    match = pattern.match(regex)
+    match = _delimited_expression(regex[0], 1).match(regex)
     if match is None:
         raise Exception("Failed to parse regular expression: '{}'".format(regex))
 
@@ -29,10 +44,12 @@ def parse_regex(regex: str) -> Pattern:
     return re.compile(pattern, flags)
 
 
-def substitute(regex: str, input_value: str, default_value: str = None) -> str:
-    separator = re.escape(regex[0])
-    pattern = re.compile('{separator}(.+){separator}(.+)({separator}([imsulx]+)?)'.format(separator=separator))
-    match = pattern.match(regex)
+@lru_cache(maxsize=CACHE_SIZE)
+def _parse_substitution(regex: str) -> Tuple[Pattern, str]:
+    """
+    Parse a substitution pattern '/{pattern}/{substitution}/{modifiers}'
+    """
+    match = _delimited_expression(regex[0], 2).match(regex)
     if match is None:
         raise Exception("Failed to parse regular expression: '{}'".format(regex))
 
@@ -41,12 +58,148 @@ def substitute(regex: str, input_value: str, default_value: str = None) -> str:
     flags = match.group(4)
     flags = resolve_flags(flags)
 
-    pattern = re.compile(pattern, flags)
+    return re.compile(pattern, flags), substitution
+
+
+def substitute(regex: str, input_value: str, default_value: str = None) -> str:
+    pattern, substitution = _parse_substitution(regex)
 
     if pattern.match(input_value) is None:
         return default_value
 
-    return re.sub(pattern, substitution, input_value)
+    return pattern.sub(substitution, input_value)
+
+
+def cache_info() -> Dict[str, Any]:
+    """
+    Returns the hit/miss statistics of the compiled-pattern caches, keyed by the function they serve
+    """
+    return dict(
+        parse_regex=parse_regex.cache_info(),
+        substitute=_parse_substitution.cache_info(),
+    )
+
+
+def cache_clear():
+    """
+    Empties the compiled-pattern caches and resets their statistics
+    """
+    parse_regex.cache_clear()
+    _parse_substitution.cache_clear()
+
+
+def warm_cache(config: Any) -> int:
+    """
+    Pre-compiles every expression found in a configuration structure, such as the one loaded from
+    data-map.yml or annex-a-merge.yml.
+
+    Values under 'regex' keys are treated as '/{pattern}/{modifiers}' expressions and values under
+    'sort_keys' as '/{pattern}/{substitution}/{modifiers}' expressions. Both may be a single string or a list.
+
+    :param config: a (nested) dict or list, for example a :class:`fddc.config.Config`
+    :return: the number of expressions compiled
+    """
+    count = 0
+    if isinstance(config, dict):
+        for key, value in config.items():
+            if key in ('regex', 'sort_keys') and value is not None:
+                compile_expression = parse_regex if key == 'regex' else _parse_substitution
+                for expression in [value] if isinstance(value, str) else value:
+                    compile_expression(expression)
+                    count += 1
+            else:
+                count += warm_cache(value)
+    elif isinstance(config, (list, tuple)):
+        for value in config:
+            count += warm_cache(value)
+    return count
+
+
+class RegexSet:
+    """
+    Compiles an ordered list of '/{pattern}/{modifiers}' rules into a combined matcher.
+
+    Each rule becomes a named alternative of a single expression, so the first rule that matches a
+    value (in the order given) is found in one scan. Rules that cannot safely be combined - those
+    that use back-references, named groups or the locale or verbose flags - are evaluated on their
+    own at their position in the list, so first-match-wins order is always kept.
+    """
+    __unsafe = re.compile(r'\\[1-9]|\(\?P[<=]')
+    __inline_flags = dict(i='i', m='m', s='s', u='')
+
+    def __init__(self, rules: Iterable[str], labels: Iterable[Any] = None):
+        self.rules = list(rules)
+        self.labels = list(range(len(self.rules))) if labels is None else list(labels)
+        if len(self.labels) != len(self.rules):
+            raise ValueError("Expected one label per rule, got {} labels for {} rules".format(
+                len(self.labels), len(self.rules)))
+
+        # Each matcher is (compiled expression, {group index: rule index}). Rules evaluated on their own are
+        # stored with the single key 0, as match.lastindex is not used for them.
+        self.__matchers: List[Tuple[Pattern, Dict[int, int]]] = []
+        combined: List[Tuple[int, str]] = []
+        for ix, rule in enumerate(self.rules):
+            alternative = self.__to_alternative(rule)
+            if alternative is None:
+                self.__add_combined(combined)
+                combined = []
+                self.__matchers.append((parse_regex(rule), {0: ix}))
+            else:
+                combined.append((ix, alternative))
+        self.__add_combined(combined)
+
+    def __to_alternative(self, rule: str) -> Union[str, None]:
+        match = _delimited_expression(rule[0], 1).match(rule)
+        if match is None:
+            raise Exception("Failed to parse regular expression: '{}'".format(rule))
+
+        pattern = match.group(1)
+        flags = match.group(3) or ''
+        if self.__unsafe.search(pattern) or 'l' in flags or 'x' in flags:
+            return None
+
+        flags = ''.join(sorted({self.__inline_flags[f] for f in flags}))
+        alternative = '(?{}:{})'.format(flags, pattern) if flags else '(?:{})'.format(pattern)
+        try:
+            re.compile(alternative)
+        except re.error:
+            return None
+        return alternative
+
+    def __add_combined(self, combined: List[Tuple[int, str]]):
+        if len(combined) == 0:
+            return
+        if len(combined) == 1:
+            ix = combined[0][0]
+            self.__matchers.append((parse_regex(self.rules[ix]), {0: ix}))
+            return
+
+        expression = '|'.join('(?P<_r{}>{})'.format(ix, alternative) for ix, alternative in combined)
+        pattern = re.compile(expression)
+        self.__matchers.append((pattern, {pattern.groupindex['_r{}'.format(ix)]: ix for ix, _ in combined}))
+
+    def match_index(self, value: str) -> Union[int, None]:
+        """
+        Returns the position of the first rule that matches value, or None if no rule matches
+        """
+        for pattern, groups in self.__matchers:
+            match = pattern.match(value)
+            if match is not None:
+                if 0 in groups:
+                    return groups[0]
+                # The rule group encloses any groups of its own, so it is always the last one closed
+                return groups[match.lastindex]
+        return None
+
+    def match(self, value: str, default: Any = None) -> Any:
+        """
+        Returns the label of the first rule that matches value, or default if no rule matches
+        """
+        ix = self.match_index(value)
+        return default if ix is None else self.labels[ix]
+
+    def __len__(self):
+        return len(self.rules)
 
 
 def make_regex_from_string(value: str) -> str:
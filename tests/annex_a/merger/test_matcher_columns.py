@@ -5,9 +5,9 @@ import numpy as np
 
 import fddc.annex_a.merger.matcher_report
 from fddc.annex_a.merger import matcher
-from fddc.annex_a.merger.configuration import RegexMatcherConfig
+from fddc.annex_a.merger.configuration import ColumnConfig, RegexMatcherConfig, SourceConfig
 from fddc.annex_a.merger.matcher import MatchedSheet
-from fddc.annex_a.merger.workbook_util import WorkSheetHeaderItem
+from fddc.annex_a.merger.workbook_util import WorkSheetDetail, WorkSheetHeaderItem
 
 
 class TestConfiguration(unittest.TestCase):
@@ -59,6 +59,43 @@ class TestConfiguration(unittest.TestCase):
         self.assertEqual(report.column_name.tolist(), ['Header 1', 'Header X', 'Header Y', np.nan])
         self.assertEqual(report.header_name.tolist(), ['Header 1', 'Header   X', '', 'Header T'])
 
+    def test_match_index_order(self):
+        header_list = [
+            WorkSheetHeaderItem(value="Header X", column_index=0),
+            WorkSheetHeaderItem(value="Header 1", column_index=1),
+            WorkSheetHeaderItem(value="Header 1 again", column_index=2),
+        ]
+        columns = [
+            ColumnConfig(name="First", regex=['/Header 1/i', '/Header X/i']),
+            ColumnConfig(name="Second", regex=['/Header/i']),
+            ColumnConfig(name="Missing"),
+        ]
+        index = matcher.ColumnMatchIndex(SourceConfig(name="Test", columns=columns))
+
+        result = index.match_headers(header_list)
+        expected = [matcher._match_header(header_list, c.matchers) for c in columns]
+        self.assertEqual(expected, result)
+        self.assertEqual([header_list[1], header_list[0], None], result)
+
+    def test_match_index_memoised(self):
+        calls = []
+
+        class CountingMatcher:
+            def match(self, value):
+                calls.append(value)
+                return value == "Header 1"
+
+        source_config = SourceConfig(name="Test", columns=[ColumnConfig(name="Header 1", matchers=[CountingMatcher()])])
+        headers = [WorkSheetHeaderItem(value=value, column_index=ix)
+                   for ix, value in enumerate(["Header 1", "Header 2", "Header 1"])]
+        sheets = [MatchedSheet(sheet_detail=WorkSheetDetail(filename=f"File {ix}", headers=headers),
+                               source_config=source_config) for ix in range(3)]
+
+        result_sheet_list = matcher.match_columns(sheets)
+        self.assertEqual(["Header 1", "Header 2"], calls)
+        for result_sheet in result_sheet_list:
+            self.assertEqual([headers[0]], [c.header for c in result_sheet.columns])
+
     def assert_sheet(self, result_sheet, sheet):
         self.assertEqual(result_sheet.sheet, sheet)
         self.assertEqual(len(result_sheet.columns), 2)
@@ -1,6 +1,6 @@
 import unittest
 
-from fddc.annex_a.merger.matcher import match_data_sources, MatchedSheet
+from fddc.annex_a.merger.matcher import classify_sheet_names, match_data_sources, MatchedSheet
 from fddc.annex_a.merger.configuration import SourceConfig
 from fddc.annex_a.merger.workbook_util import WorkSheetDetail
 
@@ -28,3 +28,21 @@ class TestMatcher(unittest.TestCase):
                          ["WARNING:fddc.annex_a.merger.matcher:No datasource identified for " +
                           "'List 2' in 'File 2'"]
                          )
+
+    def test_classify_sheet_names(self):
+        source_configuration_list = [
+            SourceConfig(name="list 1"),
+            SourceConfig(name="list 11"),
+            SourceConfig(name="other", regex=["/^List 1/i", "/^List 2/i"]),
+        ]
+
+        classified, unmatched = classify_sheet_names(
+            ["List 1", "List 2", "List 11", "List 2", "Guidance"], source_configuration_list)
+
+        # The first source in the configuration wins
+        self.assertEqual({
+            "List 1": source_configuration_list[0],
+            "List 11": source_configuration_list[0],
+            "List 2": source_configuration_list[2],
+        }, classified)
+        self.assertEqual({"Guidance"}, unmatched)
@@ -1,5 +1,6 @@
 import os
 import unittest
+from unittest import mock
 import fddc.annex_a.merger.matcher_report
 from fddc.annex_a.merger import matcher_report, configuration
 from tests.configuration import PROJECT_ROOT
@@ -17,3 +18,19 @@ class TestMatcherReport(unittest.TestCase):
         sheet_with_headers, unmatched_list = matcher_report.process_report(records, data_sources)
 
         fddc.annex_a.merger.matcher_report.column_report(sheet_with_headers, unmatched_list, "test-report.xlsx")
+
+    def test_process_scans_each_file_once(self):
+        records = matcher_report.parse_report(os.path.join(PROJECT_ROOT, "examples/matcher-report/report.xlsx"))
+        data_sources = configuration.parse_datasources(os.path.join(PROJECT_ROOT, "config/annex-a-merge.yml"))
+
+        with mock.patch.object(matcher_report.workbook_util, 'find_worksheets',
+                               wraps=matcher_report.workbook_util.find_worksheets) as find_worksheets:
+            sheet_with_headers, unmatched_list = matcher_report.process_report(records, data_sources)
+
+        filenames = [call[0][0].filename for call in find_worksheets.call_args_list]
+        self.assertEqual(len(set(filenames)), len(filenames))
+
+        for sheet in sheet_with_headers:
+            headers = {h.value: h for h in sheet.sheet.sheet_detail.headers}
+            for column in sheet.columns:
+                self.assertIs(headers[column.header.value], column.header)
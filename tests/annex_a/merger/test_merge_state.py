@@ -0,0 +1,82 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from fddc.annex_a.merger import configuration, workflow
+from fddc.annex_a.merger.merge_state import MergeState
+from tests.configuration import PROJECT_ROOT
+
+
+@unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+class TestMergeState(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.state_directory = os.path.join(self.directory.name, "state")
+        self.data_sources = configuration.parse_datasources(os.path.join(PROJECT_ROOT, "config/annex-a-merge.yml"))
+        self.sources = workflow.find_sources(os.path.join(PROJECT_ROOT, "examples/example-*.*"),
+                                             data_sources=self.data_sources)
+        # The sort key is the filename, so the A sources sort before the B sources
+        self.sources_a = [s for s in self.sources if "example-A" in s.sheet.sheet_detail.filename]
+        self.sources_b = [s for s in self.sources if "example-B" in s.sheet.sheet_detail.filename]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def merge(self, name, sources, **kwargs):
+        output_file = os.path.join(self.directory.name, name)
+        workflow.merge_dataframes(sources, self.data_sources, output_file=output_file, **kwargs)
+        return pd.read_excel(output_file, sheet_name=None)
+
+    def assertSameRows(self, expected, result):
+        self.assertEqual(list(expected.keys()), list(result.keys()))
+        for name, df in expected.items():
+            self.assertListEqual(list(df.columns), list(result[name].columns))
+            columns = list(df.columns)
+            pd.testing.assert_frame_equal(
+                df.sort_values(columns, ignore_index=True), result[name].sort_values(columns, ignore_index=True),
+                check_dtype=False)
+
+    def test_incremental_matches_full_merge(self):
+        expected = self.merge("full.xlsx", self.sources)
+
+        self.merge("first.xlsx", self.sources_a, merge_state=self.state_directory)
+        with self.assertLogs("fddc.annex_a.merger.merge_state", level="INFO") as logs:
+            result = self.merge("second.xlsx", self.sources, merge_state=self.state_directory)
+        self.assertFalse(any("rebuilding" in line for line in logs.output))
+        stored = sorted(os.path.splitext(f)[1] for f in os.listdir(self.state_directory))
+        self.assertListEqual([".feather"] * len(self.data_sources) + [".json"], stored)
+
+        self.assertSameRows(expected, result)
+
+        # Nothing new to load the third time
+        result = self.merge("third.xlsx", self.sources, merge_state=self.state_directory)
+        self.assertSameRows(expected, result)
+
+    def test_rebuild_on_earlier_source(self):
+        expected = self.merge("full.xlsx", self.sources)
+
+        self.merge("first.xlsx", self.sources_b, merge_state=self.state_directory)
+        with self.assertLogs("fddc.annex_a.merger.merge_state", level="INFO") as logs:
+            result = self.merge("second.xlsx", self.sources, merge_state=self.state_directory)
+        self.assertTrue(any("does not sort after" in line for line in logs.output))
+
+        for name, df in expected.items():
+            pd.testing.assert_frame_equal(df, result[name])
+
+    def test_plan_on_removed_source(self):
+        config = self.data_sources[0]
+        sources = [s for s in self.sources if s.sheet.source_config.name == config.name]
+        state = MergeState(self.state_directory)
+        state.save(config, sources, pd.DataFrame({"sort_key": []}))
+
+        stored, to_load = MergeState(self.state_directory).plan(config, sources)
+        self.assertIsNotNone(stored)
+        self.assertListEqual([], to_load)
+
+        stored, to_load = MergeState(self.state_directory).plan(config, sources[1:])
+        self.assertIsNone(stored)
+        self.assertListEqual(sources[1:], to_load)
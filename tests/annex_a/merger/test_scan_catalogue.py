@@ -0,0 +1,75 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from fddc.annex_a.merger import workbook_util
+from fddc.annex_a.merger.file_scanner import FileSource
+from fddc.annex_a.merger.scan_catalogue import ScanCatalogue, decode_headers, encode_headers
+from fddc.annex_a.merger.workbook_util import WorkSheetHeaderItem
+from tests.configuration import PROJECT_ROOT
+
+
+class TestScanCatalogue(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "catalogue.sqlite")
+        self.files = []
+        for example in ["example-B-2004.xlsx", "example-A-2005.xls"]:
+            filename = os.path.join(self.directory.name, example)
+            shutil.copy(os.path.join(PROJECT_ROOT, "examples", example), filename)
+            self.files.append(FileSource(filename=filename, sort_key=example))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def scan(self):
+        with mock.patch.object(workbook_util, 'find_worksheets', wraps=workbook_util.find_worksheets) as scanner:
+            with ScanCatalogue(self.filename) as catalogue:
+                worksheets, failed = catalogue.scan_workbooks(self.files)
+        self.assertEqual([], failed)
+        return worksheets, [call[0][0] for call in scanner.call_args_list]
+
+    def test_scan_once(self):
+        expected, failed = workbook_util.scan_workbooks(self.files)
+
+        worksheets, scanned = self.scan()
+        self.assertEqual(expected, worksheets)
+        self.assertEqual(self.files, scanned)
+
+        worksheets, scanned = self.scan()
+        self.assertEqual(expected, worksheets)
+        self.assertEqual([], scanned)
+
+    def test_changed_files(self):
+        self.scan()
+
+        # Touching a file does not change its contents
+        stat = os.stat(self.files[0].filename)
+        os.utime(self.files[0].filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        worksheets, scanned = self.scan()
+        self.assertEqual([], scanned)
+
+        # Replacing a file with a different workbook does
+        shutil.copy(self.files[1].filename, self.files[0].filename)
+        worksheets, scanned = self.scan()
+        self.assertEqual([self.files[0]], scanned)
+        self.assertEqual(30, len(worksheets))
+
+    def test_header_window(self):
+        self.scan()
+        with ScanCatalogue(self.filename) as catalogue:
+            self.assertIsNotNone(catalogue.lookup(self.files[0], workbook_util.DEFAULT_HEADER_WINDOW))
+            self.assertIsNone(catalogue.lookup(self.files[0], 1))
+
+    def test_encode_headers(self):
+        headers = [
+            WorkSheetHeaderItem(value='Child Unique ID', column_index=0),
+            WorkSheetHeaderItem(value=2019, column_index=1),
+            WorkSheetHeaderItem(value=datetime.datetime(2019, 3, 31), column_index=2),
+            WorkSheetHeaderItem(value='', column_index=3),
+        ]
+        self.assertEqual(headers, decode_headers(encode_headers(headers)))
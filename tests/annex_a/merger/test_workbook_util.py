@@ -1,10 +1,12 @@
 import unittest
 import os
+import tempfile
 from typing import List
 from fddc.annex_a.merger.file_scanner import FileSource
 from fddc.annex_a.merger.workbook_util import WorkSheetDetail, WorkSheetHeaderItem
 from tests.configuration import PROJECT_ROOT
 from fddc.annex_a.merger import workbook_util
+from fddc.datatables.cache import ExcelFileSource
 
 
 class TestWorkbookUtil(unittest.TestCase):
@@ -37,3 +39,44 @@ class TestWorkbookUtil(unittest.TestCase):
                             ]
         expected_headers = [WorkSheetHeaderItem(value, ix) for ix, value in enumerate(expected_headers)]
         self.assertEqual(expected_headers, list_1.headers)
+
+    def test_find_worksheets_file_source(self):
+        file_source = ExcelFileSource()
+        for filename in ["examples/example-B-2004.xlsx", "examples/example-A-2005.xls"]:
+            source = FileSource(filename=os.path.join(PROJECT_ROOT, filename))
+            result = workbook_util.find_worksheets(source, file_source=file_source)
+            self.assert_worksheets(result)
+            self.assertEqual(workbook_util.find_worksheets(source), result)
+
+    def test_find_worksheets_header_window(self):
+        for filename in ["examples/example-B-2004.xlsx", "examples/example-A-2005.xls"]:
+            source = FileSource(filename=os.path.join(PROJECT_ROOT, filename))
+            worksheets = workbook_util.find_worksheets(source, header_window=1)
+            worksheets_by_name = {ws.sheetname: ws for ws in worksheets}
+
+            # The header is on the second row so is outside the window
+            list_1 = worksheets_by_name['List_1']
+            self.assertEqual(1, list_1.header_row_index)
+            self.assertEqual([], list_1.headers)
+
+    def test_scan_workbooks(self):
+        with tempfile.TemporaryDirectory() as directory:
+            corrupt = os.path.join(directory, "corrupt.xlsx")
+            with open(corrupt, "wt") as file:
+                file.write("Not a workbook")
+
+            files = [
+                FileSource(filename=os.path.join(PROJECT_ROOT, "examples/example-B-2004.xlsx")),
+                FileSource(filename=corrupt),
+                FileSource(filename=os.path.join(PROJECT_ROOT, "examples/example-A-2005.xls")),
+            ]
+
+            serial, failed = workbook_util.scan_workbooks(files)
+            self.assertEqual(30, len(serial))
+            self.assertEqual([files[1]], [file for file, error in failed])
+            self.assertEqual([files[0].filename] * 15 + [files[2].filename] * 15, [ws.filename for ws in serial])
+
+            for parallel in ['thread', 'process']:
+                result, failed = workbook_util.scan_workbooks(files, parallel=parallel, max_workers=2)
+                self.assertEqual(serial, result)
+                self.assertEqual([files[1]], [file for file, error in failed])
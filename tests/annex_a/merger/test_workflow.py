@@ -0,0 +1,142 @@
+import inspect
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from fddc import parallel
+from fddc.annex_a.merger import configuration, workflow
+from fddc.annex_a.merger.configuration import ColumnConfig
+from fddc.annex_a.merger.matcher import MatchedColumn
+from fddc.annex_a.merger.workbook_util import WorkSheetHeaderItem
+from fddc.datatables import write
+from fddc.datatables.cache import ExcelFileSource
+from fddc.datatables.normalise import TypeCleaningReport
+from tests.configuration import PROJECT_ROOT
+
+
+class TestWorkflow(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.data_sources = configuration.parse_datasources(os.path.join(PROJECT_ROOT, "config/annex-a-merge.yml"))
+        self.sources = workflow.find_sources(os.path.join(PROJECT_ROOT, "examples/example-*.*"),
+                                             data_sources=self.data_sources)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def merge(self, name, **kwargs):
+        output_file = os.path.join(self.directory.name, name)
+        workflow.merge_dataframes(self.sources, self.data_sources, output_file=output_file, **kwargs)
+        return pd.read_excel(output_file, sheet_name=None)
+
+    def test_merge_parallel(self):
+        expected = self.merge("serial.xlsx")
+        for mode in ('thread', 'process'):
+            result = self.merge(f"{mode}.xlsx", parallel=mode, max_workers=2, max_pending=2)
+
+            self.assertEqual([d.name for d in self.data_sources], list(result.keys()))
+            for name, df in expected.items():
+                pd.testing.assert_frame_equal(df, result[name])
+
+    def test_worker_sources_closed(self):
+        created = []
+
+        def create_source(**kwargs):
+            created.append(ExcelFileSource(**kwargs))
+            return created[-1]
+
+        # A source opened by another merge running in this process
+        other = workflow._worker_file_source("other")
+        other.get_file(self.sources[0].sheet.sheet_detail.filename)
+        try:
+            with mock.patch.object(workflow, "ExcelFileSource", side_effect=create_source):
+                self.merge("thread.xlsx", parallel='thread', max_workers=2)
+
+            self.assertGreater(len(created), 0)
+            self.assertListEqual([0] * len(created), [len(s) for s in created])
+            self.assertEqual(1, len(other))
+            self.assertListEqual(["other"], list(workflow._worker_sources.keys()))
+        finally:
+            workflow._close_worker_sources("other")
+        self.assertEqual(0, len(other))
+        self.assertDictEqual({}, workflow._worker_sources)
+
+    def test_read_options(self):
+        headers = [WorkSheetHeaderItem(value="ID", column_index=4), WorkSheetHeaderItem(value="Flag", column_index=1)]
+        columns = [MatchedColumn(column=ColumnConfig(name="Child ID", type="string"), header=headers[0]),
+                   MatchedColumn(column=ColumnConfig(name="Flag"), header=headers[1])]
+        self.assertDictEqual(dict(usecols=[1, 4], dtype={"ID": object}), workflow._read_options(columns))
+        self.assertDictEqual(dict(usecols=[1], dtype=None), workflow._read_options(columns[1:]))
+        self.assertDictEqual({}, workflow._read_options(None))
+
+    def test_type_report(self):
+        serial = TypeCleaningReport()
+        self.merge("serial.xlsx", type_report=serial)
+        threaded = TypeCleaningReport()
+        self.merge("thread.xlsx", type_report=threaded, parallel='thread', max_workers=2)
+
+        self.assertListEqual(["source", "column", "type", "value", "count"], list(serial.rejected().columns))
+        pd.testing.assert_frame_equal(serial.rejected(), threaded.rejected())
+        self.assertEqual(serial.date_formats, threaded.date_formats)
+
+    def test_date_formats_scoped_to_merge(self):
+        first = workflow._worker_date_formats("first")
+        first[("file.xlsx", "D")] = "%d/%m/%Y"
+        self.assertIs(first, workflow._worker_date_formats("first"))
+        self.assertDictEqual({}, workflow._worker_date_formats("second"))
+
+        report = TypeCleaningReport()
+        self.merge("serial.xlsx", type_report=report)
+        self.assertGreater(len(report.date_formats), 0)
+        self.assertIsNone(workflow._worker_state.date_formats)
+
+    def test_output_format(self):
+        expected = self.merge("merged.xlsx")
+        output_dir = os.path.join(self.directory.name, "csv")
+        workflow.merge_dataframes(self.sources, self.data_sources, output_file=output_dir, output_format="csv")
+
+        self.assertListEqual(sorted(f"{d.name}.csv" for d in self.data_sources), sorted(os.listdir(output_dir)))
+        for name, df in expected.items():
+            result = pd.read_csv(os.path.join(output_dir, f"{name}.csv"))
+            self.assertListEqual(list(df.columns), list(result.columns))
+            self.assertEqual(df.shape, result.shape)
+
+    def test_writer_closed_on_error(self):
+        closed = []
+
+        class FailingWriter(write.TableWriter):
+            def write(self, name, df):
+                raise ValueError(name)
+
+            def close(self):
+                closed.append(self.path)
+
+        write.register_writer("failing", FailingWriter)
+        try:
+            with self.assertRaises(ValueError):
+                workflow.merge_dataframes(self.sources, self.data_sources, output_file="somewhere",
+                                          output_format="failing")
+        finally:
+            del write.WRITERS["failing"]
+        self.assertListEqual(["somewhere"], closed)
+
+    def test_loading_stopped_on_error(self):
+        generators = []
+
+        def imap_ordered(*args, **kwargs):
+            generators.append(parallel.imap_ordered(*args, **kwargs))
+            return generators[-1]
+
+        with mock.patch.object(workflow, "imap_ordered", side_effect=imap_ordered), \
+                mock.patch.object(workflow.merge, "merge_dataframes", side_effect=ValueError("merge failed")):
+            try:
+                self.merge("thread.xlsx", parallel='thread', max_workers=1, max_pending=1)
+            except ValueError:
+                # Checked while the traceback still holds the merge's frame, so the generator is not yet collected
+                self.assertEqual(inspect.GEN_CLOSED, inspect.getgeneratorstate(generators[0]))
+            else:
+                self.fail("The merge did not fail")
@@ -0,0 +1,45 @@
+import os
+import unittest
+import numpy as np
+
+from fddc.annex_a.category_index import CategoryIndex
+from fddc.annex_a.cleaner import make_category
+from fddc.config import Config
+from tests.configuration import PROJECT_ROOT
+
+
+class TestCategoryIndex(unittest.TestCase):
+
+    config = [
+        dict(code='b) Female', name='F', regex=['/^fem.*/i', r'/b\).*/i']),
+        dict(code='a) Male', name='M', regex=['/^mal.*/i', r'/a\).*/i']),
+        dict(code='c) Not stated/recorded', name='Not stated/recorded', regex=['/not.*/i', '/.*unknown.*/i']),
+    ]
+
+    def test_categorise(self):
+        index = CategoryIndex(self.config)
+        result = index.categorise(['F', 'female', 'Male', 'a) Male', 'unknown', 'Other', np.nan])
+        self.assertEqual(['b) Female', 'b) Female', 'a) Male', 'a) Male', 'c) Not stated/recorded',
+                          'not matched', 'not matched'], result.tolist())
+
+    def test_earlier_category_wins(self):
+        # 'mal' matches the regex for 'a) Male', but the name of the first category is contained in the value
+        index = CategoryIndex(self.config)
+        self.assertEqual(['b) Female'], index.categorise(['malF']).tolist())
+        self.assertEqual([1, 3], index.positions(['Male', 'Other']).tolist())
+
+    def test_separator_in_value(self):
+        index = CategoryIndex(self.config)
+        self.assertEqual(['a) Male', 'b) Female'], index.categorise(['M\x00', 'F\x00M']).tolist())
+
+    def test_same_as_make_category(self):
+        data_config = Config(os.path.join(PROJECT_ROOT, "config/data-map.yml"))["data_config"]
+        for list_config in data_config.values():
+            for column_config in list_config.values():
+                values = [v for c in column_config for v in (c['code'], c['name'], c['name'].lower(),
+                                                              ' ' + c['code'][:3], c['name'].upper() + 'M')]
+                values += ['', 'nan', 'White - British', 'Female ', 'f', 'xyz', np.nan, None]
+
+                categorize = make_category(column_config)
+                expected = [categorize(v) for v in values]
+                self.assertEqual(expected, CategoryIndex(column_config).categorise(values).tolist())
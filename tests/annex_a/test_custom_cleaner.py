@@ -0,0 +1,40 @@
+import unittest
+import numpy as np
+import pandas as pd
+
+from fddc.annex_a import custom_cleaner
+
+
+class TestCustomCleaner(unittest.TestCase):
+
+    def test_replace_values(self):
+        series = pd.Series(['F', 'James Bond', np.nan, 'Other'])
+        match = {'F': 'b) Female', 'James Bond': 'd) 1D: Individual', np.nan: 'not matched'}
+
+        result = custom_cleaner.replace_values(series, match)
+        self.assertEqual(['b) Female', 'd) 1D: Individual', 'not matched', 'Other'], result.tolist())
+
+    def test_custom_clean_sheet(self):
+        data = pd.DataFrame({
+            'Child Unique ID': [1, 1, 2],
+            'Assessment start date': ['2019-01-01', '2019-01-01', '2019-01-01'],
+            'Gender': ['F', np.nan, 'M'],
+        })
+        matching = {'Gender': {'F': 'b) Female', 'M': 'a) Male'}}
+
+        result = custom_cleaner.custom_clean_sheet(('List 2', data, matching))
+        self.assertEqual([('b) Female', 1), ('a) Male', 2)],
+                         sorted(zip(result['Gender'], result['Child Unique ID']), key=lambda r: r[1]))
+        self.assertNotIn('null_values', result.columns)
+
+    def test_custom_clean_sheet_keeps_order(self):
+        data = pd.DataFrame({
+            'Child Unique ID': [1, 2, 3, 2],
+            'Assessment start date': ['2019-01-01', '2019-01-01', None, '2019-01-01'],
+            'Gender': [np.nan, np.nan, np.nan, 'M'],
+        })
+
+        # The most complete row is kept for each key, and the rows stay in their original order
+        result = custom_cleaner.custom_clean_sheet(('List 2', data, {}))
+        self.assertEqual([1, 3, 2], result['Child Unique ID'].tolist())
+        self.assertEqual([True, True, False], result['Gender'].isnull().tolist())
@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+
+from fddc.annex_a.mapping_store import MappingStore, config_hash
+
+
+class TestMappingStore(unittest.TestCase):
+
+    config = [
+        dict(code='b) Female', name='F', regex=['/^fem.*/i']),
+        dict(code='a) Male', name='M', regex=['/^mal.*/i']),
+    ]
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "mappings.sqlite")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_categorise_and_reuse(self):
+        with MappingStore(self.filename) as store:
+            result = store.categorise('List 1', 'Gender', self.config, ['F', 'male', 'Other', np.nan])
+            self.assertEqual(['b) Female', 'a) Male', 'not matched', 'not matched'], result)
+
+        with MappingStore(self.filename) as store:
+            known = store.lookup(config_hash(self.config))
+            self.assertEqual({'F': 'b) Female', 'male': 'a) Male', 'Other': 'not matched'}, known)
+
+            # Stored values are used rather than categorised again
+            store.update(config_hash(self.config), {'Other': 'a) Male'})
+            self.assertEqual(['a) Male'], store.categorise('List 1', 'Gender', self.config, ['Other']))
+
+    def test_config_change_invalidates(self):
+        with MappingStore(self.filename) as store:
+            store.categorise('List 1', 'Gender', self.config, ['F'])
+            store.categorise('List 1', 'Gender', self.config[1:], ['M'])
+
+            self.assertEqual({}, store.lookup(config_hash(self.config)))
+            self.assertEqual({'M': 'a) Male'}, store.lookup(config_hash(self.config[1:])))
+
+    def test_shared_config_is_kept(self):
+        with MappingStore(self.filename) as store:
+            store.categorise('List 1', 'Gender', self.config, ['F'])
+            store.categorise('List 2', 'Gender', self.config, ['M'])
+            store.categorise('List 1', 'Gender', self.config[1:], ['M'])
+
+            self.assertEqual({'F': 'b) Female', 'M': 'a) Male'}, store.lookup(config_hash(self.config)))
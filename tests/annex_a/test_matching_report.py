@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+from openpyxl import load_workbook
+
+from fddc.annex_a.matching_report import MatchingReportWriter
+
+
+class TestMatchingReportWriter(unittest.TestCase):
+
+    def test_write_report(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "matching_report.xlsx")
+
+            report = MatchingReportWriter(filename)
+            report.write_sheet("List 1", [
+                ("Gender", {"F": "b) Female", "Male": "a) Male"}, ["a) Male", "b) Female", "c) Not stated"]),
+                ("Ethnicity", {"White British": "a) WBRI"}, ["a) WBRI"]),
+            ])
+            report.write_sheet("List 2", [
+                ("Gender", {"x": "not matched"}, ["a) Male", "b) Female"]),
+            ])
+            report.save()
+
+            workbook = load_workbook(filename)
+
+        self.assertEqual(["References", "List 1", "List 2"], workbook.sheetnames)
+
+        references = [[c.value for c in row] for row in workbook["References"].iter_rows()]
+        self.assertEqual([
+            ["List 1 - Gender", "List 1 - Ethnicity", "List 2 - Gender"],
+            ["a) Male", "a) WBRI", "a) Male"],
+            ["b) Female", None, "b) Female"],
+            ["c) Not stated", None, None],
+        ], references)
+
+        sheet = workbook["List 1"]
+        rows = [[c.value for c in row] for row in sheet.iter_rows()]
+        self.assertEqual([
+            ["column", "former_value", "new_value"],
+            ["Gender", "F", "b) Female"],
+            ["Gender", "Male", "a) Male"],
+            ["Ethnicity", "White British", "a) WBRI"],
+        ], rows)
+
+        validations = [(str(dv.sqref), dv.formula1) for dv in sheet.data_validations.dataValidation]
+        self.assertEqual([("C2:C3", "References!$A$2:$A$4"), ("C4", "References!$B$2:$B$2")], validations)
+
+        validations = [(str(dv.sqref), dv.formula1) for dv in workbook["List 2"].data_validations.dataValidation]
+        self.assertEqual([("C2", "References!$C$2:$C$3")], validations)
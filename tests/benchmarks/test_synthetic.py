@@ -0,0 +1,33 @@
+import os
+import unittest
+import numpy as np
+
+from benchmarks import synthetic, compare
+from fddc.annex_a.category_index import CategoryIndex
+from fddc.config import Config
+from tests.configuration import PROJECT_ROOT
+
+
+class TestSynthetic(unittest.TestCase):
+
+    def test_synthetic_list(self):
+        data_config = Config(os.path.join(PROJECT_ROOT, "config/data-map.yml"))["data_config"]
+        df = synthetic.synthetic_list("List 1", data_config["List 1"], 500, np.random.RandomState(0))
+
+        self.assertEqual(500, df.shape[0])
+        self.assertEqual(['Child Unique ID', 'Date of Contact', 'Gender', 'Ethnicity', 'Contact Source'],
+                         list(df.columns))
+
+        # Most generated values should be recognised by the cleaner, but not all of them
+        codes = CategoryIndex(data_config["List 1"]["Gender"]).categorise(df["Gender"].dropna().str.strip())
+        matched = (codes != 'not matched').mean()
+        self.assertGreater(matched, 0.5)
+        self.assertLess(matched, 1)
+
+    def test_compare(self):
+        baseline = dict(runs=[dict(rows=10, stages=dict(read=dict(seconds=1.0)))])
+        current = dict(runs=[dict(rows=10, stages=dict(read=dict(seconds=1.5))),
+                             dict(rows=20, stages=dict(read=dict(seconds=1.0)))])
+
+        self.assertEqual([(10, 'read', 'seconds', 1.0, 1.5, 1.5, True)], compare.compare(baseline, current))
+        self.assertEqual([(10, 'read', 'seconds', 1.0, 1.5, 1.5, False)], compare.compare(baseline, current, 2.0))
@@ -0,0 +1,88 @@
+import unittest
+from fddc.datatables import dedupe
+import numpy as np
+import pandas as pd
+
+
+class TestDedupe(unittest.TestCase):
+
+    def test_row_keys(self):
+        df = pd.DataFrame({"A": [1, 1, 2, None, None], "B": ["x", "x", "x", "y", "y"]})
+        keys, key_count = dedupe.row_keys(df, ["A", "B"])
+        self.assertEqual(3, key_count)
+        self.assertEqual(keys[0], keys[1])
+        self.assertEqual(keys[3], keys[4])
+        self.assertEqual(3, len({keys[0], keys[2], keys[3]}))
+
+    def test_most_complete(self):
+        df = pd.DataFrame({
+            "ID": [1, 1, 2, 2, 3],
+            "Date": ["a", "a", "b", "b", "c"],
+            "Value": [None, "full", "first", "second", None],
+        })
+        result, stats = dedupe.deduplicate(df, ["ID", "Date"])
+
+        # The most complete row wins, the first on ties, and row order is kept
+        self.assertListEqual([1, 2, 4], list(result.index))
+        self.assertListEqual(["full", "first", None], list(result["Value"]))
+
+        self.assertEqual(5, stats.rows_before)
+        self.assertEqual(3, stats.rows_after)
+        self.assertEqual(2, stats.rows_dropped)
+        self.assertListEqual([1, 2], list(stats.dropped["ID"]))
+        self.assertListEqual([1, 1], list(stats.dropped["dropped"]))
+
+    def test_most_complete_matches_drop_duplicates(self):
+        random_state = np.random.RandomState(0)
+        df = pd.DataFrame({
+            "ID": random_state.randint(0, 50, 500),
+            "Date": random_state.choice(["a", "b", None], 500),
+            "Value": random_state.choice([1.0, np.nan], 500),
+            "Other": random_state.choice(["x", None], 500),
+        })
+        result, stats = dedupe.deduplicate(df, ["ID", "Date"])
+
+        expected = df.assign(null_values=df.isnull().sum(axis=1)).sort_values("null_values", kind="mergesort")
+        expected = expected.drop_duplicates(subset=["ID", "Date"]).drop(columns="null_values").sort_index()
+        pd.testing.assert_frame_equal(expected, result)
+        self.assertEqual(stats.rows_dropped, stats.dropped["dropped"].sum())
+
+    def test_latest(self):
+        df = pd.DataFrame({
+            "ID": [1, 1, 1, 2],
+            "Sort": ["2020", "2021", "2019", None],
+            "Value": ["b", "c", "a", "d"],
+        })
+        result, stats = dedupe.deduplicate(df, ["ID"], keep="latest", sort_key="Sort")
+        self.assertListEqual(["c", "d"], list(result["Value"]))
+
+        result, stats = dedupe.deduplicate(df, ["ID"], keep="latest")
+        self.assertListEqual(["a", "d"], list(result["Value"]))
+
+    def test_latest_coalesce(self):
+        df = pd.DataFrame({
+            "ID": [1, 1, 2, 1],
+            "Sort": [1, 3, 1, 2],
+            "A": ["old", None, "only", "mid"],
+            "B": [None, None, None, 7.0],
+        })
+        result, stats = dedupe.deduplicate(df, ["ID"], keep="latest", sort_key="Sort", coalesce=True)
+
+        expected = df.sort_values("Sort", kind="mergesort").groupby("ID").last().reset_index()
+        self.assertListEqual(list(expected["A"]), list(result["A"]))
+        self.assertListEqual([7.0], list(result["B"].dropna()))
+        self.assertEqual(expected["B"].dtype, result["B"].dtype)
+        self.assertListEqual([3, 1], list(result["Sort"]))
+
+    def test_invalid_options(self):
+        df = pd.DataFrame({"ID": [1, 1]})
+        with self.assertRaises(ValueError):
+            dedupe.deduplicate(df, ["ID"], keep="random")
+        with self.assertRaises(ValueError):
+            dedupe.deduplicate(df, ["ID"], coalesce=True)
+
+    def test_empty(self):
+        df = pd.DataFrame({"ID": [], "Value": []})
+        result, stats = dedupe.deduplicate(df, ["ID"])
+        self.assertEqual(0, result.shape[0])
+        self.assertEqual(0, stats.rows_dropped)
@@ -1,8 +1,22 @@
+import datetime
+import importlib.util
 import unittest
 import os
+import shutil
+import tempfile
+from unittest import mock
 
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+from fddc.annex_a.merger import configuration, workflow
 from fddc.annex_a.merger.workbook_util import WorkSheetDetail
-from fddc.datatables import load
+from fddc.datatables import cache, load, normalise
 from tests.configuration import PROJECT_ROOT
 
 
@@ -17,8 +31,149 @@ class TestLoad(unittest.TestCase):
         self.assertIs(file_a, file_c)
         self.assertIsNot(file_a, file_b)
 
+    def test_file_source_eviction(self):
+        file_a = os.path.join(PROJECT_ROOT, "examples/example-B-2004.xlsx")
+        file_b = os.path.join(PROJECT_ROOT, "examples/example-A-2005.xls")
+
+        with load.ExcelFileSource(max_files=1) as src:
+            excel_a = src.get_file(file_a)
+            src.get_file(file_b)
+            self.assertEqual(1, len(src))
+            self.assertIsNot(excel_a, src.get_file(file_a))
+
+            stats = src.stats()
+            self.assertEqual(0, stats.hits)
+            self.assertEqual(3, stats.misses)
+            self.assertEqual(2, stats.evictions)
+            self.assertEqual(os.path.getsize(file_a), stats.bytes)
+
+        self.assertEqual(0, len(src))
+
+    def test_file_source_in_use(self):
+        file_a = os.path.join(PROJECT_ROOT, "examples/example-B-2004.xlsx")
+        file_b = os.path.join(PROJECT_ROOT, "examples/example-A-2005.xls")
+
+        with mock.patch.object(pd.ExcelFile, "close", autospec=True) as close:
+            with load.ExcelFileSource(max_files=1) as src:
+                with src.open_file(file_a) as excel_a:
+                    with src.open_file(file_a) as excel_a_again:
+                        self.assertIs(excel_a, excel_a_again)
+                    excel_b = src.get_file(file_b)
+                    # Evicted, but only closed once no longer used
+                    self.assertEqual(1, src.stats().evictions)
+                    close.assert_not_called()
+                close.assert_called_once_with(excel_a)
+
+                with src.open_file(file_b):
+                    src.close()
+                    self.assertEqual(1, close.call_count)
+                self.assertEqual(2, close.call_count)
+                close.assert_called_with(excel_b)
+
+    def test_file_source_max_bytes(self):
+        file_a = os.path.join(PROJECT_ROOT, "examples/example-B-2004.xlsx")
+        file_b = os.path.join(PROJECT_ROOT, "examples/example-A-2005.xls")
+
+        with load.ExcelFileSource(max_files=None, max_bytes=os.path.getsize(file_a)) as src:
+            src.get_file(file_a)
+            src.get_file(file_b)
+            self.assertEqual(1, len(src))
+            self.assertEqual(1, src.stats().evictions)
+
+    def test_file_source_changed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "example.xlsx")
+            shutil.copy(os.path.join(PROJECT_ROOT, "examples/example-B-2004.xlsx"), filename)
+
+            with load.ExcelFileSource() as src:
+                file_a = src.get_file(filename)
+                self.assertIs(file_a, src.get_file(filename))
+
+                stat = os.stat(filename)
+                os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+                file_b = src.get_file(filename)
+
+                self.assertIsNot(file_a, file_b)
+                self.assertEqual(1, len(src))
+                self.assertEqual(1, src.stats().hits)
+
     def test_load_single(self):
         file = WorkSheetDetail(os.path.join(PROJECT_ROOT, "examples/example-B-2004.xlsx"), sheetname="List_1")
 
         df = load.load_dataframe(file)
         self.assertIsNotNone(df)
+
+    def test_load_matched_columns(self):
+        data_sources = configuration.parse_datasources(os.path.join(PROJECT_ROOT, "config/annex-a-merge.yml"))
+        for filename in ["examples/example-A-2005.xls", "examples/example-B-2004.xlsx"]:
+            sources = workflow.find_sources(os.path.join(PROJECT_ROOT, filename), data_sources=data_sources)
+            source = sources[0]
+            detail = source.sheet.sheet_detail
+            matched = source.columns[::2]
+            column_map = {c.header.value: c.column.name for c in matched}
+
+            df = load.load_dataframe(detail, usecols=[c.header.column_index for c in matched])
+            self.assertListEqual(list(column_map.keys()), list(df.columns))
+
+            expected = load.load_dataframe(detail)
+            expected = normalise.normalise_dataframe(expected, list(column_map.values()), column_map)
+            result = normalise.normalise_dataframe(df, list(column_map.values()), column_map)
+            pd.testing.assert_frame_equal(expected, result)
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+    def test_load_cached(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "example.xls")
+            shutil.copy(os.path.join(PROJECT_ROOT, "examples/example-A-2005.xls"), filename)
+            file = WorkSheetDetail(filename, sheetname="List_1", header_row_index=2)
+            cache = load.DataFrameCache(os.path.join(directory, "cache"))
+
+            expected = load.load_dataframe(file)
+            with mock.patch.object(load.pd, "read_excel", wraps=load.pd.read_excel) as read_excel:
+                pd.testing.assert_frame_equal(expected, load.load_dataframe(file, dataframe_cache=cache))
+                pd.testing.assert_frame_equal(expected, load.load_dataframe(file, dataframe_cache=cache))
+                self.assertEqual(1, read_excel.call_count)
+
+                # A changed file is read again
+                stat = os.stat(filename)
+                os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+                load.load_dataframe(file, dataframe_cache=cache)
+                self.assertEqual(2, read_excel.call_count)
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+    def test_cache_mixed_types(self):
+        df = pd.DataFrame({
+            "Text": ["a", None, "c"],
+            "Mixed": [1, "b", datetime.datetime(2020, 1, 1)],
+            "Number": [1.5, np.nan, 3],
+            "Date": pd.to_datetime(["2020-01-01", None, "2020-03-01"]),
+            2019: [True, False, True],
+        })
+        with tempfile.TemporaryDirectory() as directory:
+            cache = load.DataFrameCache(directory)
+            self.assertTrue(cache.put("key", df))
+            expected = df.assign(Text=["a", np.nan, "c"])
+            pd.testing.assert_frame_equal(expected, cache.get("key"))
+            self.assertIsNone(cache.get("other"))
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+    def test_cache_value_types(self):
+        values = [None, "a", True, 2 ** 60 + 1, 1.0, np.nan, -7, pd.NaT, pd.Timestamp("2020-01-02 03:04:05"),
+                  datetime.datetime(2020, 1, 2, 3, 4, 5, 6), datetime.date(2020, 1, 2), datetime.time(3, 4, 5, 6)]
+        df = pd.DataFrame({"Mixed": values, 1.5: [1] * len(values), datetime.date(2020, 1, 1): values[::-1]})
+        df["Ints"] = pd.Series([1, 2] * (len(values) // 2), dtype=object)
+        df["Category"] = pd.Categorical(["a", "b"] * (len(values) // 2))
+        df["Count"] = pd.array([1, None] * (len(values) // 2), dtype="Int64")
+
+        table = cache.frame_to_table(df)
+        self.assertNotIn(pa.binary(), table.schema.types)
+        result = cache.table_to_frame(table)
+
+        pd.testing.assert_frame_equal(df, result)
+        self.assertListEqual(list(df.columns), list(result.columns))
+        for column in ["Mixed", "Ints"]:
+            self.assertListEqual([type(v) for v in df[column]], [type(v) for v in result[column]])
+            self.assertListEqual([str(v) for v in df[column]], [str(v) for v in result[column]])
+
+        with self.assertRaises(TypeError):
+            cache.frame_to_table(pd.DataFrame({"Other": [1, object()]}))
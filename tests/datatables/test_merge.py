@@ -0,0 +1,116 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from fddc.annex_a.merger.configuration import ColumnConfig
+from fddc.datatables import merge
+
+
+class TestMerge(unittest.TestCase):
+
+    columns = [
+        ColumnConfig(name="ID", unique=True),
+        ColumnConfig(name="Gender"),
+        ColumnConfig(name="Age"),
+    ]
+
+    def frames(self):
+        return [
+            pd.DataFrame({"ID": [1, 2, 3], "Gender": ["M", "F", "F"], "Age": [1.0, 2.0, 3.0], "sort_key": "2019"}),
+            pd.DataFrame({"ID": [1, 2, None], "Gender": ["F", None, "M"], "Age": [np.nan, 5.0, 6.0],
+                          "sort_key": "2020"}),
+        ]
+
+    def test_merge_coalesce(self):
+        df = merge.merge_dataframes(self.frames(), self.columns, sort_key="sort_key")
+
+        self.assertEqual(["ID", "Gender", "Age"], list(df.columns))
+        self.assertEqual([1, 2, 3], list(df["ID"]))
+        self.assertEqual(["F", "F", "F"], list(df["Gender"]))
+        self.assertEqual([1.0, 5.0, 3.0], list(df["Age"]))
+
+    def test_merge_latest_row(self):
+        df = merge.merge_dataframes(self.frames(), self.columns, sort_key="sort_key", coalesce=False)
+
+        self.assertEqual(["F", None, "F"], [None if pd.isnull(v) else v for v in df["Gender"]])
+        self.assertTrue(np.isnan(df["Age"][0]))
+
+    def test_merge_sorted_by_key(self):
+        frames = [
+            pd.DataFrame({"ID": [5, 3, 1], "Sub": ["b", "a", "a"], "sort_key": "2019"}),
+            pd.DataFrame({"ID": [9, 4, 3, 5], "Sub": ["a", "a", "a", "a"], "sort_key": "2020"}),
+        ]
+        columns = [ColumnConfig(name="ID", unique=True), ColumnConfig(name="Sub", unique=True)]
+        df = merge.merge_dataframes(frames, columns, sort_key="sort_key")
+
+        self.assertListEqual([1, 3, 4, 5, 5, 9], list(df["ID"]))
+        self.assertListEqual(["a", "a", "a", "a", "b", "a"], list(df["Sub"]))
+        self.assertListEqual(list(range(6)), list(df.index))
+
+    def test_merge_without_unique_columns(self):
+        frames = [
+            pd.DataFrame({"ID": [1, 2], "sort_key": "2020"}),
+            pd.DataFrame({"ID": [3, 4], "sort_key": "2019"}),
+        ]
+        df = merge.merge_dataframes(frames, [ColumnConfig(name="ID")], sort_key="sort_key")
+        self.assertListEqual([3, 4, 1, 2], list(df["ID"]))
+
+    def test_merge_categorise(self):
+        expected = merge.merge_dataframes(self.frames(), self.columns, sort_key="sort_key")
+
+        frames = self.frames()
+        df = merge.merge_dataframes(frames, self.columns, sort_key="sort_key", categorise=True)
+
+        pd.testing.assert_frame_equal(expected, df)
+        self.assertEqual("category", frames[0]["Gender"].dtype.name)
+        self.assertEqual(frames[0]["Gender"].dtype, frames[1]["Gender"].dtype)
+        self.assertEqual(object, frames[0]["sort_key"].dtype)
+
+    def test_merge_categorise_string_keys(self):
+        frames = [
+            pd.DataFrame({"ID": ["c", "b", "a", "c"], "Sub": ["y", "x", "x", "x"], "sort_key": "2019"}),
+            pd.DataFrame({"ID": ["b", "c", "a"], "Sub": ["x", "x", "y"], "sort_key": "2020"}),
+        ]
+        columns = [ColumnConfig(name="ID", unique=True), ColumnConfig(name="Sub", unique=True)]
+        expected = merge.merge_dataframes([f.copy() for f in frames], columns, sort_key="sort_key")
+        df = merge.merge_dataframes(frames, columns, sort_key="sort_key", categorise=True)
+
+        self.assertEqual("category", frames[0]["ID"].dtype.name)
+        self.assertListEqual(["a", "a", "b", "c", "c"], list(df["ID"]))
+        self.assertListEqual(["x", "y", "x", "x", "y"], list(df["Sub"]))
+        pd.testing.assert_frame_equal(expected, df)
+
+    def test_categorise_repeated(self):
+        frames = [
+            pd.DataFrame({"Repeated": ["a", "b", "a", "a"], "Unique": ["1", "2", "3", "4"]}),
+            pd.DataFrame({"Repeated": ["c", "a", None, "b"], "Unique": ["5", "6", "7", "8"]}),
+        ]
+        converted = merge.categorise_repeated(frames)
+
+        self.assertEqual(["Repeated"], converted)
+        self.assertEqual(["a", "b", "c"], list(frames[0]["Repeated"].cat.categories))
+        self.assertEqual("category", pd.concat(frames)["Repeated"].dtype.name)
+        self.assertEqual(object, frames[0]["Unique"].dtype)
+
+    def test_union_categories(self):
+        df1 = pd.DataFrame({"ID": [1, 2], "Gender": pd.Categorical(["M", "F"])})
+        df2 = pd.DataFrame({"ID": [2, 3], "Gender": pd.Categorical(["X", None])})
+        columns = [ColumnConfig(name="ID", unique=True), ColumnConfig(name="Gender")]
+        result = merge.merge_dataframes([df1, df2], columns)
+
+        self.assertEqual("category", str(result["Gender"].dtype))
+        self.assertListEqual(["M", "X", None], [None if pd.isna(v) else v for v in result["Gender"]])
+
+    def test_categorise_mixed_types(self):
+        frames = [
+            pd.DataFrame({"ID": [1, 2, 3, 4], "Value": [True, "x", "x", 1.5], "sort_key": "2019"}),
+            pd.DataFrame({"ID": [5, 6, 7, 8], "Value": [1, "x", 1, 0], "sort_key": "2020"}),
+        ]
+        columns = [ColumnConfig(name="ID", unique=True), ColumnConfig(name="Value")]
+        df = merge.merge_dataframes(frames, columns, sort_key="sort_key", categorise=True)
+
+        values = list(df["Value"])
+        self.assertListEqual([True, "x", "x", 1.5, 1, "x", 1, 0], values)
+        self.assertListEqual([bool, str, str, float, int, str, int, int], [type(v) for v in values])
+        self.assertEqual(object, frames[1]["Value"].dtype)
@@ -1,5 +1,9 @@
+import datetime
+import tracemalloc
 import unittest
+from fddc.annex_a.merger.configuration import ColumnConfig
 from fddc.datatables import normalise
+import numpy as np
 import pandas as pd
 
 
@@ -25,3 +29,124 @@ class TestNormalise(unittest.TestCase):
         self.assertEqual("A", values["A"])
         self.assertEqual("B", values["B"])
         self.assertEqual("C", values["K"])
+
+    def test_clean_dates(self):
+        values = ["01/02/2019", "2019-01-02", "01/13/2019", "not a date", None, "01/02/2019",
+                  datetime.datetime(2019, 3, 4), "not a date", ""]
+        df = pd.DataFrame({"D": pd.Series(values, dtype=object)})
+        expected = pd.to_datetime(df["D"], dayfirst=True, errors="coerce").dt.date
+
+        report = normalise.TypeCleaningReport()
+        df = normalise.clean_datatypes(df, [ColumnConfig(name="D", type="date")], report=report, source="file.xlsx")
+        pd.testing.assert_series_equal(expected, df["D"])
+        self.assertEqual(datetime.date(2019, 2, 1), df["D"][0])
+
+        rejected = report.rejected()
+        self.assertListEqual(["not a date", ""], list(rejected["value"]))
+        self.assertListEqual([2, 1], list(rejected["count"]))
+        self.assertListEqual(["file.xlsx", "file.xlsx"], list(rejected["source"]))
+        self.assertEqual("%d/%m/%Y", report.date_formats[("file.xlsx", "D")])
+
+    def test_infer_date_format(self):
+        values = np.array(["2019-01-31", "2019-02-01", "31/01/2019"], dtype=object)
+        self.assertEqual("%Y-%m-%d", normalise.infer_date_format(values))
+        self.assertEqual("%d/%m/%Y", normalise.infer_date_format(values[2:], preferred="%d/%m/%Y"))
+        self.assertIsNone(normalise.infer_date_format(np.array(["unknown"], dtype=object)))
+
+    def test_clean_dates_matches_general_parser(self):
+        random_state = np.random.RandomState(0)
+        dates = pd.Timestamp("2000-01-01") + pd.to_timedelta(random_state.randint(0, 8000, 200), unit="D")
+        pool = (list(dates.strftime("%d/%m/%Y")) + list(dates[:20].strftime("%Y-%m-%d")) +
+                list(dates[:20].strftime("%m/%d/%Y")) + list(dates[:20].strftime("%d/%m/%y")) +
+                ["", "x", None, np.nan, "29/02/2019", "20190102", datetime.datetime(2010, 5, 6), 43000])
+        df = pd.DataFrame({"D": pd.Series([pool[ix] for ix in random_state.randint(0, len(pool), 2000)],
+                                          dtype=object)})
+        expected = pd.to_datetime(df["D"], dayfirst=True, errors="coerce").dt.date
+
+        report = normalise.TypeCleaningReport()
+        result = normalise.clean_datatypes(df.copy(), [ColumnConfig(name="D", type="date")], report=report)
+        pd.testing.assert_series_equal(expected, result["D"])
+        self.assertEqual(df["D"].count() - result["D"].count(), report.rejected()["count"].sum())
+
+    def test_clean_types(self):
+        df = pd.DataFrame({
+            "Int": ["1", 2, 3.0, 3.5, "x", None, " 4 "],
+            "String": [1.0, "a", None, 2.5, "b", "a", 3],
+            "Bool": ["Yes", "n", True, 0, "maybe", None, "TRUE"],
+            "Category": ["M", "F", "M", None, "M", "F", "F"],
+        })
+        spec = [ColumnConfig(name="Int", type="int"), ColumnConfig(name="String", type="string"),
+                ColumnConfig(name="Bool", type="bool"), ColumnConfig(name="Category", type="category")]
+        report = normalise.TypeCleaningReport()
+        df = normalise.clean_datatypes(df, spec, report=report, source="file.xlsx")
+
+        self.assertEqual("Int64", str(df["Int"].dtype))
+        self.assertListEqual([1, 2, 3, None, None, None, 4], [None if pd.isna(v) else v for v in df["Int"]])
+        self.assertIsInstance(df["String"].dtype, pd.StringDtype)
+        self.assertListEqual(["1", "a", None, "2.5", "b", "a", "3"], [None if pd.isna(v) else v for v in df["String"]])
+        self.assertEqual("boolean", str(df["Bool"].dtype))
+        self.assertListEqual([True, False, True, False, None, None, True],
+                             [None if pd.isna(v) else v for v in df["Bool"]])
+        self.assertEqual("category", str(df["Category"].dtype))
+        self.assertListEqual(["F", "M"], list(df["Category"].cat.categories))
+
+        rejected = report.rejected()
+        self.assertListEqual([("Int", 3.5), ("Int", "x"), ("Bool", "maybe")],
+                             list(zip(rejected["column"], rejected["value"])))
+
+        memory = report.memory()
+        self.assertListEqual(["Int", "String", "Bool", "Category"], list(memory["column"]))
+        self.assertListEqual(list(memory["bytes_before"] - memory["bytes_after"]), list(memory["bytes_saved"]))
+
+    def test_clean_large_ints(self):
+        large = 2 ** 53 + 1
+        df = pd.DataFrame({"Int": [large, str(large), f" {large + 2} ", "1e3", "nan", "1" + "0" * 20, 2.0 ** 60]})
+        df = normalise.clean_datatypes(df, [ColumnConfig(name="Int", type="int")])
+        self.assertListEqual([large, large, large + 2, 1000, None, None, 2 ** 60],
+                             [None if pd.isna(v) else v for v in df["Int"]])
+
+    def test_category_mixed_types(self):
+        df = pd.DataFrame({"Mixed": [1, 1.0, True, "1", None], "Text": ["a", "b", None, "a", "b"]})
+        spec = [ColumnConfig(name="Mixed", type="category"), ColumnConfig(name="Text", type="category")]
+        df = normalise.clean_datatypes(df, spec)
+
+        self.assertEqual(object, df["Mixed"].dtype)
+        self.assertListEqual([int, float, bool, str], [type(v) for v in df["Mixed"][:4]])
+        self.assertEqual("category", str(df["Text"].dtype))
+
+    def test_category_saves_memory(self):
+        df = pd.DataFrame({"Gender": np.random.RandomState(0).choice(["a) Male", "b) Female"], 10000)})
+        report = normalise.TypeCleaningReport()
+        normalise.clean_datatypes(df, [ColumnConfig(name="Gender", type="category")], report=report)
+        memory = report.memory()
+        self.assertGreater(memory["bytes_before"][0], 10 * memory["bytes_after"][0])
+
+    def test_normalise_does_not_copy(self):
+        rows = 100000
+        df = pd.DataFrame({f"C{ix}": np.arange(rows, dtype=float) for ix in range(10)})
+        column_map = {f"C{ix}": f"N{ix}" for ix in range(8)}
+        column_names = [f"N{ix}" for ix in range(8)] + ["Missing"]
+
+        tracemalloc.start()
+        try:
+            result = normalise.normalise_dataframe(df, column_names, column_map, copy=False)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        # Only the missing column is allocated - the others share the data of the input frame
+        missing_bytes = rows * 8
+        self.assertLess(peak, missing_bytes + df.memory_usage(index=False).sum() / 10)
+        self.assertTrue(np.shares_memory(df["C3"].to_numpy(), result["N3"].to_numpy()))
+        self.assertListEqual(column_names, list(result.columns))
+        self.assertTrue(result["Missing"].isnull().all())
+        self.assertEqual(np.float64, result["Missing"].dtype)
+
+    def test_normalise_copies(self):
+        df = pd.DataFrame({"A": [1.0, 2.0], "B": ["x", "y"]})
+        result = normalise.normalise_dataframe(df, ["A", "B", "C"])
+
+        result.iloc[0, 0] = 10.0
+        result.loc[1, "B"] = "z"
+        result["C"] = 1
+        pd.testing.assert_frame_equal(pd.DataFrame({"A": [1.0, 2.0], "B": ["x", "y"]}), df)
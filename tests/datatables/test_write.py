@@ -0,0 +1,98 @@
+import datetime
+import importlib.util
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from fddc.datatables import write
+
+
+class TestWrite(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.df = pd.DataFrame({
+            "ID": [1, 2, 3],
+            "Text": ["a", None, "=not a formula"],
+            "Number": [1.5, np.nan, 3],
+            "Date": [datetime.date(2020, 1, 1), pd.NaT, datetime.date(2020, 3, 1)],
+            "Category": pd.Categorical(["x", "y", None]),
+            "Count": pd.array([1, None, 3], dtype="Int64"),
+        })
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def test_xlsx(self):
+        with write.create_writer(self.path("merged.xlsx")) as writer:
+            writer.write("List 1", self.df)
+            writer.write("List 2", self.df.iloc[:0])
+
+        with pd.ExcelWriter(self.path("pandas.xlsx"), engine="xlsxwriter") as writer:
+            self.df.to_excel(writer, sheet_name="List 1", index=False)
+        expected = pd.read_excel(self.path("pandas.xlsx"), sheet_name=None)["List 1"]
+        expected.loc[2, "Text"] = "=not a formula"
+
+        result = pd.read_excel(self.path("merged.xlsx"), sheet_name=None)
+        self.assertListEqual(["List 1", "List 2"], list(result.keys()))
+        pd.testing.assert_frame_equal(expected, result["List 1"])
+        self.assertListEqual(list(self.df.columns), list(result["List 2"].columns))
+
+    def test_xlsx_too_many_rows(self):
+        with mock.patch.object(write.ExcelTableWriter, "MAX_ROWS", 3):
+            with write.create_writer(self.path("merged.xlsx")) as writer:
+                with self.assertRaises(ValueError):
+                    writer.write("List 1", self.df)
+
+    def test_csv(self):
+        for output_format, filename in [("csv", "List 1.csv"), ("csv.gz", "List 1.csv.gz")]:
+            with write.create_writer(self.path(output_format), output_format) as writer:
+                writer.write("List 1", self.df)
+            result = pd.read_csv(os.path.join(self.path(output_format), filename))
+            self.assertListEqual(list(self.df.columns), list(result.columns))
+            self.assertListEqual([1, 2, 3], list(result["ID"]))
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+    def test_arrow_formats(self):
+        df = self.df.assign(Mixed=[1, "b", None])
+        for output_format, read in [("parquet", pd.read_parquet), ("feather", pd.read_feather)]:
+            with write.create_writer(self.path(output_format), output_format) as writer:
+                writer.write("List 1", df)
+            result = read(os.path.join(self.path(output_format), f"List 1.{output_format}"))
+
+            pd.testing.assert_frame_equal(self.df, result.drop(columns="Mixed"), check_categorical=False)
+            self.assertEqual("Int64", str(result["Count"].dtype))
+            self.assertListEqual(["1", "b", None], list(result["Mixed"]))
+        self.assertListEqual([1, "b", None], list(df["Mixed"]))
+
+    def test_registry(self):
+        written = []
+
+        class ListWriter(write.TableWriter):
+            def write(self, name, df):
+                written.append((self.path, name, df.shape))
+
+        write.register_writer("list", ListWriter)
+        try:
+            with write.create_writer("somewhere", "list") as writer:
+                writer.write("List 1", self.df)
+        finally:
+            del write.WRITERS["list"]
+
+        self.assertListEqual([("somewhere", "List 1", (3, 6))], written)
+        with self.assertRaises(ValueError):
+            write.create_writer("somewhere", "list")
+
+    def test_write_is_abstract(self):
+        class NoWriter(write.TableWriter):
+            pass
+
+        with self.assertRaises(TypeError):
+            NoWriter("somewhere")
@@ -1,5 +1,9 @@
 import unittest
+import os
+from fddc import regex
+from fddc.config import Config
 from fddc.regex import parse_regex, substitute
+from tests.configuration import PROJECT_ROOT
 import re
 
 
@@ -40,6 +44,90 @@ class TestSubstitute(unittest.TestCase):
         value = substitute(r'/t(es)t/-\1-/', "test", "default")
         self.assertEqual(value, "-es-", "Shold only retain 'es'")
 
+    def test_no_match(self):
+        value = substitute(r'/t(es)t/-\1-/', "other", "default")
+        self.assertEqual(value, "default", "Should return default value")
+
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        regex.cache_clear()
+
+    def test_hits_and_misses(self):
+        p1 = parse_regex('/cached/i')
+        p2 = parse_regex('/cached/i')
+        self.assertIs(p1, p2)
+
+        info = regex.cache_info()["parse_regex"]
+        self.assertEqual(1, info.hits)
+        self.assertEqual(1, info.misses)
+
+        substitute(r'/t(es)t/-\1-/', "test")
+        substitute(r'/t(es)t/-\1-/', "test")
+        info = regex.cache_info()["substitute"]
+        self.assertEqual(1, info.hits)
+        self.assertEqual(1, info.misses)
+
+    def test_clear(self):
+        parse_regex('/cached/i')
+        regex.cache_clear()
+        self.assertEqual(0, regex.cache_info()["parse_regex"].currsize)
+
+    def test_warm_cache_data_map(self):
+        config = Config(os.path.join(PROJECT_ROOT, "config/data-map.yml"))
+        count = regex.warm_cache(config)
+        self.assertGreater(count, 0)
+        misses = regex.cache_info()["parse_regex"].misses
+
+        parse_regex('/^fem.*/i')
+        self.assertEqual(misses, regex.cache_info()["parse_regex"].misses)
+
+    def test_warm_cache_merge_config(self):
+        config = Config(os.path.join(PROJECT_ROOT, "config/annex-a-merge.yml"))
+        self.assertGreater(regex.warm_cache(config), 0)
+
+    def test_warm_cache_sort_keys(self):
+        count = regex.warm_cache(dict(input=[dict(include="*.xlsx", sort_keys=[r'/.*?(\d+).*/\1/i'])]))
+        self.assertEqual(1, count)
+        self.assertEqual(1, regex.cache_info()["substitute"].currsize)
+
+
+class TestRegexSet(unittest.TestCase):
+
+    def test_first_match_wins(self):
+        regex_set = regex.RegexSet(['/^fem.*/i', '/.*male.*/i', '/f/'], labels=['F', 'M', 'f'])
+        self.assertEqual('F', regex_set.match('Female'))
+        self.assertEqual('M', regex_set.match('a male'))
+        self.assertEqual('f', regex_set.match('f'))
+        self.assertIsNone(regex_set.match('Other'))
+        self.assertEqual('X', regex_set.match('Other', default='X'))
+
+    def test_index_labels(self):
+        regex_set = regex.RegexSet(['/a/', '/b/'])
+        self.assertEqual(1, regex_set.match('b'))
+        self.assertEqual(1, regex_set.match_index('b'))
+        self.assertEqual(2, len(regex_set))
+
+    def test_flags_are_scoped(self):
+        regex_set = regex.RegexSet(['/test/', '/TEST/i', '/a.b/s'])
+        self.assertEqual(0, regex_set.match('test'))
+        self.assertEqual(1, regex_set.match('Test'))
+        self.assertEqual(2, regex_set.match('a\nb'))
+
+    def test_groups_in_rules(self):
+        regex_set = regex.RegexSet(['/(x)(y)/', '/a(b(c))?/', '/(d)\\1/', '/e/'])
+        self.assertEqual(0, regex_set.match('xy'))
+        self.assertEqual(1, regex_set.match('abc'))
+        self.assertEqual(1, regex_set.match('a'))
+        self.assertEqual(2, regex_set.match('dd'))
+        self.assertIsNone(regex_set.match('d'))
+        self.assertEqual(3, regex_set.match('e'))
+
+    def test_label_count(self):
+        with self.assertRaises(ValueError):
+            regex.RegexSet(['/a/', '/b/'], labels=['A'])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+from fddc.parallel import imap_ordered, map_ordered
+
+
+def _square(value):
+    if value < 0:
+        raise ValueError(value)
+    return value * value
+
+
+class TestParallel(unittest.TestCase):
+
+    def test_serial(self):
+        self.assertEqual([1, 4, 9], map_ordered(_square, [1, 2, 3]))
+
+    def test_thread(self):
+        self.assertEqual([1, 4, 9], map_ordered(_square, [1, 2, 3], parallel='thread', max_workers=2))
+
+    def test_process(self):
+        self.assertEqual([1, 4, 9], map_ordered(_square, [1, 2, 3], parallel='process', max_workers=2))
+
+    def test_exceptions(self):
+        with self.assertRaises(ValueError):
+            map_ordered(_square, [1, -1], parallel='thread')
+
+        result = map_ordered(_square, [1, -1, 2], parallel='thread', return_exceptions=True)
+        self.assertEqual(1, result[0])
+        self.assertIsInstance(result[1], ValueError)
+        self.assertEqual(4, result[2])
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            map_ordered(_square, [1], parallel='cluster')
+
+    def test_imap_ordered(self):
+        for parallel in [None, 'thread', 'process']:
+            result = imap_ordered(_square, range(20), parallel=parallel, max_workers=2, max_pending=3)
+            self.assertEqual([v * v for v in range(20)], list(result))
+
+    def test_imap_bounded(self):
+        consumed = []
+
+        def items():
+            for value in range(10):
+                consumed.append(value)
+                yield value
+
+        results = imap_ordered(_square, items(), parallel='thread', max_workers=2, max_pending=3)
+        self.assertEqual(0, next(results))
+        # Only max_pending items have been taken before the first result was returned
+        self.assertEqual(4, len(consumed))
+        self.assertEqual([v * v for v in range(1, 10)], list(results))
+
+    def test_imap_exception(self):
+        results = imap_ordered(_square, [1, -1, 2], parallel='thread', max_workers=2)
+        self.assertEqual(1, next(results))
+        with self.assertRaises(ValueError):
+            next(results)